@@ -1,10 +1,48 @@
 # flask_app.py
 import os
 import json
+import logging
 import re
 import random
+import difflib
+import unicodedata
+import functools
+import hashlib
+import itertools
+import bisect
+import heapq
+import threading
+import queue
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
 from dotenv import load_dotenv
-from flask import Flask, request, render_template
+from flask import Flask, Response, request, render_template
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    from rapidfuzz import fuzz, process
+except ImportError:
+    fuzz = process = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 # ========== ENVIRONMENT SETUP ==========
 load_dotenv()
@@ -15,12 +53,83 @@ if not API_KEY:
 # Import the GenAI client
 try:
     from google import genai
+    from google.genai import types as genai_types
 except Exception:
     raise SystemExit("google-genai missing. Install with: pip install google-genai")
 
+
+def _gemini_http_options():
+    """
+    Keep-alive pool sizing (and HTTP/2 when the h2 package is installed) for the
+    SDK's shared httpx client, so model calls reuse warm TLS connections.
+    Returns None on SDK versions without client_args, which keep their defaults.
+    """
+    if "client_args" not in getattr(genai_types.HttpOptions, "model_fields", {}):
+        return None
+    try:
+        import httpx
+    except ImportError:
+        return None
+    try:
+        import h2  # noqa: F401  (only needed for http2=True)
+        http2 = True
+    except ImportError:
+        http2 = False
+    max_conn = int(os.getenv("GEMINI_MAX_CONNECTIONS", 32))
+    return genai_types.HttpOptions(
+        client_args={
+            "http2": http2,
+            "limits": httpx.Limits(
+                max_connections=max_conn, max_keepalive_connections=max_conn
+            ),
+        }
+    )
+
+
+def _gemini_config():
+    """
+    Request config pinning the Gemini service tier (GEMINI_TIER, default "standard";
+    empty leaves it to the account default). Every call here has a user waiting on
+    it, so none use the cheaper, slower "flex" tier by default.
+    Returns None on SDK versions without service_tier.
+    """
+    tier = os.getenv("GEMINI_TIER", "standard").strip().lower()
+    if not tier or "service_tier" not in getattr(
+        genai_types.GenerateContentConfig, "model_fields", {}
+    ):
+        return None
+    return genai_types.GenerateContentConfig(service_tier=tier)
+
+
 # Flask app setup
 app = Flask(__name__)
-CLIENT = genai.Client(api_key=API_KEY)
+# Static URLs carry the file's mtime (?v=...), so browsers and CDNs may keep them
+# for a long time and still pick up a new file as soon as it changes.
+app.config["SEND_FILE_MAX_AGE_DEFAULT"] = int(os.getenv("STATIC_MAX_AGE", 31536000))
+
+
+@app.url_defaults
+def _static_version(endpoint, values):
+    if endpoint == "static" and "filename" in values:
+        try:
+            mtime = os.stat(os.path.join(app.static_folder, values["filename"])).st_mtime
+        except OSError:
+            return
+        values.setdefault("v", int(mtime))
+
+
+CLIENT = genai.Client(api_key=API_KEY, http_options=_gemini_http_options())
+GEMINI_CONFIG = _gemini_config()
+
+# Response headers shared by every return site (Flask only reads them)
+TXT_HEADERS = {"Content-Type": "text/plain; charset=utf-8"}
+HTML_HEADERS = {"Content-Type": "text/html; charset=utf-8"}
+
+# Gemini calls are blocking HTTP round-trips; run them here so a handler can
+# overlap the model latency with its own local work.
+GEMINI_POOL = ThreadPoolExecutor(
+    max_workers=int(os.getenv("GEMINI_WORKERS", 8)), thread_name_prefix="gemini"
+)
 
 # ========== DATABASE LOADING ==========
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -32,39 +141,73 @@ if not os.path.exists(DB_PATH):
         "Create an 'Export' folder beside flask_app.py and place pc_database.json inside it."
     )
 
+
+def _json_dumps(obj) -> str:
+    """Compact, non-ASCII-preserving JSON text (orjson when available)."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
 # Load the database (with safer JSON error reporting)
 try:
-    with open(DB_PATH, "r", encoding="utf-8") as f:
-        DATABASE = json.load(f)
+    with open(DB_PATH, "rb") as f:
+        raw_db = f.read()
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError
+    DATABASE = orjson.loads(raw_db) if orjson is not None else json.loads(raw_db)
 
 except json.JSONDecodeError as je:
     raise SystemExit(f"Failed to parse JSON database at {DB_PATH}: {je}")
 except Exception as e:
     raise SystemExit(f"Failed to load database at {DB_PATH}: {e}")
 
+# Every category the app reads is a list (missing ones become empty), so the rest of
+# the module can index DATABASE[cat] without guards
+DB_CATEGORIES = (
+    "motherboards", "cpus", "gpus", "rams", "storages",
+    "nvmes", "ssds", "hdds", "psus", "coolers",
+)
+for _cat in DB_CATEGORIES:
+    if not isinstance(DATABASE.setdefault(_cat, []), list):
+        raise SystemExit(f"Database category '{_cat}' in {DB_PATH} must be a list")
+
 app.logger.info(
     f"Loaded component database from {DB_PATH} "
-    f"({len(DATABASE.get('cpus', []))} CPUs, {len(DATABASE.get('motherboards', []))} motherboards, etc.)"
+    f"({len(DATABASE['cpus'])} CPUs, {len(DATABASE['motherboards'])} motherboards, etc.)"
 )
 
-# Ensure 'storages' category exists and includes SSDs, NVMe, and HDDs
-if "storages" not in DATABASE or not DATABASE["storages"]:
-    DATABASE["storages"] = []
+# Ensure 'storages' includes SSDs, NVMe, and HDDs
+if not DATABASE["storages"]:
     for k in ("ssds", "nvmes", "hdds"):
-        if k in DATABASE and isinstance(DATABASE[k], list):
-            DATABASE["storages"].extend(DATABASE[k])
+        DATABASE["storages"].extend(DATABASE[k])
 
     # Optional: log the merge result
     app.logger.info(
-        f"Merged {len(DATABASE.get('storages', []))} storage items (from SSD/NVMe/HDD categories)."
+        f"Merged {len(DATABASE['storages'])} storage items (from SSD/NVMe/HDD categories)."
     )
 
+# (category, items) for every list-valued DB entry, in file order
+DB_LIST_CATS = [(k, v) for k, v in DATABASE.items() if isinstance(v, list)]
+
+# Component names handed to the model as context; the DB is immutable at runtime.
+# PROMPT_NAMES_PER_CAT > 0 caps each category in the all-category summary, for
+# catalogs large enough that the name lists dominate the prompt (0 or negative = no
+# cap; the prompt tells the model to recommend only listed parts, so a cap trades
+# coverage for prompt size). Single-category prompts always carry their full list.
+PROMPT_NAMES_PER_CAT = max(0, int(os.getenv("PROMPT_NAMES_PER_CAT", 0)))
+DB_SUMMARY_JSON = _json_dumps(
+    {
+        k: [it.get("displayName", "") for it in DATABASE[k]][: PROMPT_NAMES_PER_CAT or None]
+        for k in ("motherboards", "cpus", "gpus", "rams", "storages", "psus", "coolers")
+    }
+)
+
 # ---------- Greeting detection helpers ----------
 GREET_PAT = re.compile(
     r"\b(h+i+|h+e+l+l+o+|hey+|hiya+|yo+|sup|hi+ya+|hello+)\b",
     flags=re.IGNORECASE,
 )
-QUESTION_WORDS = {
+QUESTION_WORDS = frozenset({
     "what",
     "who",
     "where",
@@ -81,28 +224,283 @@ QUESTION_WORDS = {
     "compatibility",
     "explain",
     "tell",
+})
+SHORT_GREETINGS = ("hi", "hello", "hey", "hiya", "yo", "sup")
+
+# ---------- Output trimming character sets ----------
+# The characters regex \s (and str.isspace) accept, plus backticks; str.strip with
+# these does the work of the old ^[`\s]+ / [`\s]+$ regexes.
+WHITESPACE_CHARS = (
+    "\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f \x85\xa0\u1680\u2000\u2001\u2002\u2003"
+    "\u2004\u2005\u2006\u2007\u2008\u2009\u200a\u2028\u2029\u202f\u205f\u3000"
+)
+EDGE_STRIP_CHARS = WHITESPACE_CHARS + "`"
+LEAD_QUOTE_CHARS = EDGE_STRIP_CHARS + "\"'"
+
+# ---------- Request limits ----------
+MAX_QUERY_CHARS = int(os.getenv("MAX_QUERY_CHARS", 2000))
+# Control characters dropped from queries (tab and newline are kept)
+QUERY_CTRL_TABLE = dict.fromkeys([*range(0, 9), *range(11, 32)])
+
+# ---------- Precompiled request patterns ----------
+SMFP_RE = re.compile(r"\b(smfp|smfp computer|smfp computer trading)\b", re.IGNORECASE)
+SPECS_RE = re.compile(
+    r"\b(specs|specifications|spec|details|configuration)\b", re.IGNORECASE
+)
+PRICE_RE = re.compile(
+    r"\b(price|how much|cost|how much is|how much does|price of)\b", re.IGNORECASE
+)
+BUILD_RE = re.compile(
+    r"\b(build(?:\s+me)?|recommend(?:ation| me)?|suggest(?:ion|)?|suggest(?: me)?|pc build|system build|gaming build|budget build|assemble|reco(?:mend)?)\b",
+    re.IGNORECASE,
+)
+# Words GREETING_STRIP_RE can start with, for a cheap startswith() check before it runs
+GREETING_PREFIXES = ("hi", "hello", "hey", "greetings", "good ")
+# Plain substrings that every SMFP/SPECS/PRICE/BUILD_RE match contains; checking
+# these first skips the regex entirely for the (common) queries that cannot match
+SMFP_KEYS = ("smfp",)
+SPECS_KEYS = ("spec", "detail", "configuration")
+PRICE_KEYS = ("price", "how much", "cost")
+BUILD_KEYS = ("build", "suggest", "assemble", "reco")
+BUDGET_HINT_RE = re.compile(
+    r"(?:₱|\bphp\b)?\s*\d{2,3}[,.\d]*\s*(k|000)?", re.IGNORECASE
+)
+GREETING_STRIP_RE = re.compile(
+    r"^\s*(?:hi|hello|hey|hiya|greetings|good morning|good afternoon|good evening)\b[^.?!]{0,200}[.?!]\s*",
+    re.IGNORECASE,
+)
+TOKEN_RE = re.compile(r"\w+")
+PUNCT_DASH_RE = re.compile(r"[^\w\s\-]")
+WS_RE = re.compile(r"\s+")
+# Line boundaries str.splitlines() honours besides \n
+OTHER_LINE_BREAKS_RE = re.compile(r"[\r\x0b\x0c\x1c-\x1e\x85\u2028\u2029]")
+HUMAN_KEY_SPLIT = re.compile(r"(_|-)+")
+CAMEL_SPLIT = re.compile(r"([a-z0-9])([A-Z])")
+
+# Category keywords for the price-range fallback; group order is the priority
+# used when several categories are named
+CATEGORY_GUESS_RE = re.compile(
+    r"\b(?:"
+    r"(?P<cpus>ryzen|intel|core i|corei|corei3|corei5|corei7|corei9|xeon|athlon)"
+    r"|(?P<gpus>rtx|gtx|rx|radeon|graphics|gpu|graphics card)"
+    r"|(?P<motherboards>b\d+|x\d+|z\d+|h\d+|prime|tuf|pro|mpg|aorus|asus|msi)"
+    r"|(?P<rams>ddr|ram|memory)"
+    r"|(?P<storages>ssd|nvme|sata|hdd|hard drive|storage)"
+    r"|(?P<psus>psu|power supply|watt)"
+    r"|(?P<coolers>cooler|aio|liquid|air cooler|masterliquid|hyper)"
+    r")\b"
+)
+CATEGORY_PRIORITY = {
+    name: i for i, name in enumerate(
+        ("cpus", "gpus", "motherboards", "rams", "storages", "psus", "coolers")
+    )
 }
 
 
+def _guess_category(q: str):
+    """Return the highest-priority category named in q, scanning it only once."""
+    best = None
+    for m in CATEGORY_GUESS_RE.finditer(q):
+        cat = m.lastgroup
+        if best is None or CATEGORY_PRIORITY[cat] < CATEGORY_PRIORITY[best]:
+            best = cat
+            if CATEGORY_PRIORITY[cat] == 0:
+                break
+    return best
+
+
+@functools.lru_cache(maxsize=2048)
 def looks_like_greeting(text: str) -> bool:
-    if not text or len(text.strip()) == 0:
+    t = text.strip() if text else ""
+    if not t:
         return False
-    low = text.lower()
-    tokens = re.findall(r"\w+", low)
-    if any(q in tokens for q in QUESTION_WORDS):
+    greeted = GREET_PAT.search(t) is not None
+    low = t.lower()
+    # Most queries are questions: reject them before tokenizing
+    if not greeted and (len(t) > 12 or not any(g in low for g in SHORT_GREETINGS)):
         return False
-    if GREET_PAT.search(text):
-        return True
-    if len(tokens) <= 2 and len(text.strip()) <= 12:
-        for g in ("hi", "hello", "hey", "hiya", "yo", "sup"):
-            if g in low:
-                return True
-    return False
+    tokens = TOKEN_RE.findall(low)
+    if QUESTION_WORDS.intersection(tokens):
+        return False
+    return greeted or len(tokens) <= 2
+
+
+# ---------- Component name index ----------
+# Drop control characters; map narrow/no-break spaces and slashes to plain spaces
+_NORMALIZE_TABLE = dict.fromkeys(range(32))
+_NORMALIZE_TABLE.update(dict.fromkeys(map(ord, "\u202f\u00a0/\\"), " "))
+
+
+def normalize_text(s: str) -> str:
+    if not s:
+        return ""
+    s = s.translate(_NORMALIZE_TABLE)
+    s = PUNCT_DASH_RE.sub(" ", s)
+    s = WS_RE.sub(" ", s).strip().lower()
+    return s
+
+
+# Built once at startup: (displayName, normalized name, item, category),
+# longest names first so substring matching prefers the most specific item.
+# Hyphenated names are also indexed with spaces ("b650-plus" -> "b650 plus"), so
+# a name typed without the hyphen still matches.
+NAME_INDEX = []
+for _cat, _items in DB_LIST_CATS:
+    for _it in _items:
+        _dn = _it.get("displayName", "") or ""
+        _dn_norm = normalize_text(_dn)
+        if _dn_norm:
+            NAME_INDEX.append((_dn, _dn_norm, _it, _cat))
+            if "-" in _dn_norm:
+                _dn_spaced = WS_RE.sub(" ", _dn_norm.replace("-", " ")).strip()
+                if _dn_spaced:
+                    NAME_INDEX.append((_dn, _dn_spaced, _it, _cat))
+NAME_INDEX.sort(key=lambda x: -len(x[1]))
+NAMES_NORM_LIST = [x[1] for x in NAME_INDEX]
+# Normalized name -> first (longest-first) NAME_INDEX row with that name
+NAME_INDEX_BY_NORM = {}
+for _row in NAME_INDEX:
+    NAME_INDEX_BY_NORM.setdefault(_row[1], _row)
+# Per-row name tokens for the overlap matcher, split once here instead of per request
+NAME_TOKENS = [frozenset(n.split()) for n in NAMES_NORM_LIST]
+NAME_TOKEN_COUNTS = [len(t) for t in NAME_TOKENS]
+# Token -> NAME_INDEX positions (ascending) whose name contains it
+NAME_TOKEN_POSTINGS = {}
+for _pos, _tokens in enumerate(NAME_TOKENS):
+    for _tok in _tokens:
+        NAME_TOKEN_POSTINGS.setdefault(_tok, []).append(_pos)
+# Negated name lengths (ascending, parallel to NAME_INDEX) for bisecting by length
+NAME_NEG_LENS = [-len(n) for n in NAMES_NORM_LIST]
+
+# Aho-Corasick automaton over the normalized names (value = first index position),
+# so "which names occur inside the query" is a single pass over the query.
+NAME_AUTOMATON = None
+if ahocorasick is not None and NAME_INDEX:
+    NAME_AUTOMATON = ahocorasick.Automaton()
+    for _pos, _row in enumerate(NAME_INDEX):
+        if not NAME_AUTOMATON.exists(_row[1]):
+            NAME_AUTOMATON.add_word(_row[1], _pos)
+    NAME_AUTOMATON.make_automaton()
+
+
+def _find_by_substring(qnorm: str):
+    """
+    Return the first NAME_INDEX row whose name contains, or is contained in, qnorm.
+    Same result as scanning the longest-first index, without comparing every name.
+    """
+    qlen = len(qnorm)
+    # Names at least as long as the query can only contain it
+    for pos in range(bisect.bisect_right(NAME_NEG_LENS, -qlen)):
+        if qnorm in NAMES_NORM_LIST[pos]:
+            return NAME_INDEX[pos]
+    # Shorter names can only be contained in the query
+    if NAME_AUTOMATON is not None:
+        hits = [pos for _, pos in NAME_AUTOMATON.iter(qnorm)]
+        return NAME_INDEX[min(hits)] if hits else None
+    for pos in range(bisect.bisect_left(NAME_NEG_LENS, -qlen), len(NAME_INDEX)):
+        if NAMES_NORM_LIST[pos] in qnorm:
+            return NAME_INDEX[pos]
+    return None
+
+
+def _find_by_tokens(qnorm: str, min_score: float):
+    """
+    Return (row, score) for the NAME_INDEX row sharing the largest fraction of its
+    tokens with qnorm, or None if no row reaches min_score.
+    """
+    # Only rows sharing at least one token with the query can score above zero
+    overlaps = {}
+    for tok in frozenset(qnorm.split()):
+        for pos in NAME_TOKEN_POSTINGS.get(tok, ()):
+            overlaps[pos] = overlaps.get(pos, 0) + 1
+    best_pos = -1
+    best_score = 0.0
+    for pos, overlap in overlaps.items():
+        score = overlap / NAME_TOKEN_COUNTS[pos]
+        # ties go to the earliest (longest-name-first) row, as in a full scan
+        if score > best_score or (score == best_score and pos < best_pos):
+            best_score = score
+            best_pos = pos
+    if best_pos >= 0 and best_score >= min_score:
+        return NAME_INDEX[best_pos], best_score
+    return None
+
+
+def _find_by_fuzzy(qnorm: str):
+    """Return the NAME_INDEX row closest to qnorm (similarity >= 70%), or None."""
+    if process is not None:
+        best = process.extractOne(
+            qnorm, NAMES_NORM_LIST, scorer=fuzz.ratio, score_cutoff=70
+        )
+        return NAME_INDEX[best[2]] if best else None
+    close = difflib.get_close_matches(qnorm, NAMES_NORM_LIST, n=1, cutoff=0.7)
+    return NAME_INDEX_BY_NORM[close[0]] if close else None
+
+
+@functools.lru_cache(maxsize=4096)
+def _resolve_component(qnorm: str, min_overlap: float):
+    """
+    Look qnorm up by substring, then token overlap, then fuzzy similarity.
+    Returns (NAME_INDEX row, match kind) or None. Only depends on its arguments
+    and the startup index, so repeated queries are served from the cache.
+    """
+    row = _find_by_substring(qnorm)
+    if row:
+        return row, "substring"
+    hit = _find_by_tokens(qnorm, min_overlap)
+    if hit:
+        return hit[0], "token overlap"
+    row = _find_by_fuzzy(qnorm)
+    if row:
+        return row, "fuzzy"
+    return None
+
+
+# Last-resort spec lookup on raw lowercased names (containment either way), in the
+# spec handler's category order followed by any other categories. A category is
+# listed once: re-scanning the same names could never produce a new match.
+SPEC_SCAN_ORDER = (
+    "motherboards", "cpus", "gpus", "rams", "psus", "coolers",
+    "nvmes", "ssds", "hdds", "storages",
+)
+SPEC_SCAN = [
+    ((it.get("displayName") or "").lower(), it, cat)
+    for cat, items in sorted(
+        DB_LIST_CATS,
+        key=lambda ci: (
+            SPEC_SCAN_ORDER.index(ci[0]) if ci[0] in SPEC_SCAN_ORDER else len(SPEC_SCAN_ORDER)
+        ),
+    )
+    for it in items
+]
+
+
+def find_component(name_lower: str):
+    for dn, item, cat in SPEC_SCAN:
+        if name_lower in dn or dn in name_lower:
+            return item, cat
+    return None, "component"
 
 
 # ---------------------------
 # Helpers used by build recommender
 # ---------------------------
+PRICE_K_RE = re.compile(r"^([\d\.]+)\s*k$")
+PRICE_NON_NUMERIC_RE = re.compile(r"[^\d\.]+")
+# The number must contain a digit, so stray punctuation ("hi, build 30k") is skipped
+BUILD_BUDGET_RE = re.compile(r"(?:(?:php|₱)\s*)?([.,]*\d[\d.,]*)\s*(k)?")
+USAGE_GAMING_RE = re.compile(r"\b(gaming|game|fps|esports)\b")
+USAGE_PRODUCTIVITY_RE = re.compile(
+    r"\b(productiv|workstation|render|content|video edit|photo edit)\b"
+)
+USAGE_OFFICE_RE = re.compile(r"\b(office|home office|small business)\b")
+# Name/brand hints that nudge an item's score towards the detected usage
+GAMING_DESC_RE = re.compile(r"\b(gaming|xt|rtx|rx|oc|super|ti|xt)\b")
+PRODUCTIVITY_DESC_RE = re.compile(
+    r"\b(workstation|pro|xeon|threadripper|radeon pro|quadro|w)\b"
+)
+
+
 def _safe_float(v):
     try:
         if v is None:
@@ -110,11 +508,12 @@ def _safe_float(v):
         if isinstance(v, (int, float)):
             return float(v)
         s = str(v).strip().lower().replace("php", "").replace("₱", "").replace(",", "")
-        m = re.match(r"^([\d\.]+)\s*k$", s)
+        m = PRICE_K_RE.match(s)
         if m:
             return float(m.group(1)) * 1000.0
-        digits = re.sub(r"[^\d\.]+", "", s)
-        return float(digits) if re.search(r"[\d\.]", digits) else None
+        # digits and dots only; float() rejects leftovers like ".." (caught below)
+        digits = PRICE_NON_NUMERIC_RE.sub("", s)
+        return float(digits) if digits else None
     except Exception:
         return None
 
@@ -126,48 +525,129 @@ def _format_php(n):
         return str(n)
 
 
+# ---------- Price statistics (built once at startup) ----------
+# (price, item) for every item with a parseable price, per category in DB order.
+# Prices live beside the items rather than in them: the spec table shows every field.
+PRICED_ITEMS = {
+    _cat: [
+        (p, it) for it in _items for p in (_safe_float(it.get("price")),) if p is not None
+    ]
+    for _cat, _items in DB_LIST_CATS
+}
+
+
+def _usage_hints(it):
+    """Usages ("gaming"/"productivity") an item's brand and name hint at."""
+    desc = " ".join(
+        [str(it.get("brand") or "").lower(), (it.get("displayName") or "").lower()]
+    )
+    return frozenset(
+        usage
+        for usage, pattern in (
+            ("gaming", GAMING_DESC_RE),
+            ("productivity", PRODUCTIVITY_DESC_RE),
+        )
+        if pattern.search(desc)
+    )
+
+
+# Usage hints aligned with PRICED_ITEMS, for the recommender's scoring bonus
+PRICED_ITEM_HINTS = {
+    cat: [_usage_hints(it) for _, it in pairs] for cat, pairs in PRICED_ITEMS.items()
+}
+
+# Parsed prices per category, sorted ascending, so ranges and medians are index reads
+PRICES_BY_CAT = {
+    cat: sorted(p for p, _ in pairs) for cat, pairs in PRICED_ITEMS.items() if pairs
+}
+ALL_PRICES_SORTED = sorted(p for prices in PRICES_BY_CAT.values() for p in prices)
+STORAGE_PRICES_SORTED = sorted(
+    p
+    for k in ("nvmes", "ssds", "hdds", "storages")
+    for p in PRICES_BY_CAT.get(k, [])
+)
+
+
+def _price_range(prices):
+    return (prices[0], prices[-1]) if prices else None
+
+
+PRICE_STATS = {cat: _price_range(prices) for cat, prices in PRICES_BY_CAT.items()}
+STORAGE_STATS = _price_range(STORAGE_PRICES_SORTED)
+GLOBAL_PRICE_STATS = _price_range(ALL_PRICES_SORTED)
+
+# Median non-zero price, used to guess a budget when the user gives none
+_nonzero_prices = [p for p in ALL_PRICES_SORTED if p]
+MEDIAN_PRICE = _nonzero_prices[len(_nonzero_prices) // 2] if _nonzero_prices else None
+
+
+# ---------- Build recommendation HTML ----------
+# Static pieces of the option tables; only names and prices vary per row
+BUILD_CAT_LABELS = {
+    cat: cat[:-1].capitalize() if cat.endswith("s") else cat.capitalize()
+    for cat in ("motherboards", "cpus", "rams", "storages", "coolers", "gpus", "psus")
+}
+BUILD_BRIEFS = {
+    "gaming": (
+        "This build is optimized for smooth gaming performance, "
+        "balancing graphics capability and processing power around {budget}."
+    ),
+    "productivity": (
+        "This build is designed for creative and work tasks such as editing, rendering, and multitasking — "
+        "a reliable productivity build around {budget}."
+    ),
+    "office": (
+        "This is a cost-efficient setup ideal for everyday office and home use, "
+        "built around {budget}."
+    ),
+    "general": (
+        "This is a general-purpose build suitable for common tasks, offering solid all-around performance "
+        "around {budget}."
+    ),
+}
+BUILD_TABLE_HEAD = "\n".join(
+    (
+        '<table style="border-collapse:collapse; width:100%; table-layout:fixed; margin-bottom:8px;">',
+        "<thead><tr>",
+        '<th style="width:60%; text-align:left; padding:4px 4px; font-weight:600">Component</th>',
+        '<th style="width:40%; text-align:right; padding:4px 4px; font-weight:600">Price</th>',
+        "</tr></thead><tbody>",
+    )
+)
+BUILD_ROW_TMPL = (
+    "<tr>"
+    "<td style='width:70%; padding:4px; vertical-align:top; word-break:break-word'>{}: {}</td>"
+    "<td style='width:30%; padding:4px; vertical-align:top; text-align:right'>{}</td>"
+    "</tr>"
+)
+BUILD_EMPTY_ROW_TMPL = (
+    "<tr>"
+    "<td style='padding:6px 12px 6px 0;vertical-align:top'>{}:</td>"
+    "<td style='padding:6px 8px;vertical-align:top;text-align:right'>{}</td>"
+    "</tr>"
+)
+BUILD_TOTAL_ROW_TMPL = (
+    "<tr>"
+    "<td style='border-top:1px solid #e6eef2;padding:8px 12px 6px 0;font-weight:700'>Total estimated price:</td>"
+    "<td style='border-top:1px solid #e6eef2;padding:8px 8px;font-weight:700;text-align:right'>{}</td>"
+    "</tr>"
+)
+BUILD_FOOTNOTE = (
+    "<div style='margin-top:10px;font-size:0.95em;color:#444'>(Note: all recommended components "
+    "are selected only from the local database. Small variance around the budget is allowed.)</div>"
+)
+
+
 # ---------------------------
 # Deterministic Build Recommender (DB-driven) — returns 2-3 options, HTML table format
 # ---------------------------
-def recommend_build_from_db(query_text: str):
+@functools.lru_cache(maxsize=512)
+def _recommend_build(usage: str, budget):
     """
-    DB-only build recommender that returns HTML.
-    Produces 2-3 build options (min 2, max 3). Uses only items from DATABASE.
-    Each option's component list is returned as an HTML table (Component | Price).
+    The build options for a parsed (usage, budget) as a response tuple.
+    Only depends on its arguments and the startup DB, so repeated build requests
+    are served from the cache. budget may be None (estimated from DB prices).
     """
-    q = (query_text or "").lower()
-
-    # --- Detect budget ---
-    budget = None
-    m = re.search(r"(?:(?:php|₱)\s*)?([0-9\.,]+)\s*(k)?", q)
-    if m:
-        try:
-            num = m.group(1).replace(",", "")
-            val = float(num)
-            if m.group(2):
-                val *= 1000.0
-            budget = val
-        except Exception:
-            budget = None
-    else:
-        m2 = re.search(r"(\d+)\s*k\b", q)
-        if m2:
-            try:
-                budget = float(m2.group(1)) * 1000.0
-            except Exception:
-                budget = None
-
-    # --- Detect usage ---
-    usage = "general"
-    if re.search(r"\b(gaming|game|fps|esports)\b", q):
-        usage = "gaming"
-    elif re.search(
-        r"\b(productiv|workstation|render|content|video edit|photo edit)\b", q
-    ):
-        usage = "productivity"
-    elif re.search(r"\b(office|home office|small business)\b", q):
-        usage = "office"
-
     # --- Allocation ---
     alloc = {
         "motherboards": 0.10,
@@ -179,55 +659,36 @@ def recommend_build_from_db(query_text: str):
         "psus": 0.06,
     }
 
-    def score_item(it, target_price):
-        price = _safe_float(it.get("price"))
-        if price is None:
-            return float("inf")
-        diff = abs(price - target_price) / max(1.0, target_price)
-        desc = " ".join(
-            [str(it.get("brand") or "").lower(), (it.get("displayName") or "").lower()]
-        )
-        score = diff
-        if usage == "gaming" and re.search(
-            r"\b(gaming|xt|rtx|rx|oc|super|ti|xt)\b", desc
-        ):
-            score *= 0.85
-        if usage == "productivity" and re.search(
-            r"\b(workstation|pro|xeon|threadripper|radeon pro|quadro|w)\b", desc
-        ):
+    def score_item(hints, price, target_price):
+        score = abs(price - target_price) / max(1.0, target_price)
+        if usage in hints:
             score *= 0.85
         return score
 
     def top_n_for_cat(cat_name, target_price, n=5):
-        items = DATABASE.get(cat_name, []) or []
-        scored = []
-        for it in items:
-            p = _safe_float(it.get("price"))
-            if p is None:
-                continue
-            s = score_item(it, target_price)
-            scored.append((s, p, it))
-        scored.sort(key=lambda x: (x[0], x[1]))
-        return [it for _, _, it in scored[:n]]
+        """Best (price, item) pairs for the target, closest first."""
+        # nsmallest matches sorted(...)[:n], ties included, without sorting everything
+        best = heapq.nsmallest(
+            n,
+            (
+                (score_item(hints, p, target_price), p, it)
+                for (p, it), hints in zip(
+                    PRICED_ITEMS.get(cat_name, ()), PRICED_ITEM_HINTS.get(cat_name, ())
+                )
+            ),
+            key=lambda x: (x[0], x[1]),
+        )
+        return [(p, it) for _, p, it in best]
 
     # --- Estimate budget if missing ---
     if budget is None:
-        all_prices = []
-        for cat, items in DATABASE.items():
-            if isinstance(items, list):
-                for it in items:
-                    p = _safe_float(it.get("price"))
-                    if p:
-                        all_prices.append(p)
-        if not all_prices:
+        if MEDIAN_PRICE is None:
             return (
                 "I could not estimate a budget because the database lacks price data.",
                 200,
-                {"Content-Type": "text/plain; charset=utf-8"},
+                TXT_HEADERS,
             )
-        all_prices.sort()
-        median = all_prices[len(all_prices) // 2]
-        budget = median * 5.0
+        budget = MEDIAN_PRICE * 5.0
 
     allowed_over = max(0.05 * budget, 1000.0)
 
@@ -241,8 +702,13 @@ def recommend_build_from_db(query_text: str):
         return (
             "I could not find enough components in the database to make recommendations.",
             200,
-            {"Content-Type": "text/plain; charset=utf-8"},
+            TXT_HEADERS,
         )
+    # Cheapest shortlisted (price, item) per category: the only swap target the
+    # downgrade loop and the final cap ever use
+    cheapest = {
+        cat: min(cands, key=lambda pc: pc[0]) for cat, cands in candidates.items() if cands
+    }
 
     max_variants = 0
     for cat in ["cpus", "gpus", "rams", "motherboards"]:
@@ -269,8 +735,8 @@ def recommend_build_from_db(query_text: str):
             elif cand_list:
                 pick = cand_list[0]
             if pick:
-                price = _safe_float(pick.get("price")) or 0.0
-                chosen.append([cat, pick, price])
+                price, item = pick
+                chosen.append([cat, item, price])
                 total += price
             else:
                 chosen.append([cat, None, 0.0])
@@ -278,34 +744,20 @@ def recommend_build_from_db(query_text: str):
         if total <= budget + allowed_over:
             return chosen, total
 
-        # downgrade loop (greedy: replace most expensive with next cheaper)
-        tried = True
-        while total > budget + allowed_over and tried:
-            tried = False
-            expensive = sorted(
-                [c for c in chosen if c[1] is not None], key=lambda x: -x[2]
-            )
-            for cat, current_item, current_price in expensive:
-                cand_list = candidates.get(cat, []) or []
-                cheaper = None
-                for cand in cand_list:
-                    cp = _safe_float(cand.get("price"))
-                    if cp is None:
-                        continue
-                    if cp < current_price - 0.0001:
-                        if cheaper is None or cp < _safe_float(cheaper.get("price")):
-                            cheaper = cand
-                if cheaper:
-                    new_price = _safe_float(cheaper.get("price")) or 0.0
-                    for c in chosen:
-                        if c[0] == cat and c[1] == current_item:
-                            c[1] = cheaper
-                            total = total - current_price + new_price
-                            c[2] = new_price
-                            tried = True
-                            break
-                if tried:
-                    break
+        # downgrade loop (greedy: swap the most expensive pick that has a cheaper
+        # shortlisted alternative for that alternative; ties go to the earlier slot)
+        while total > budget + allowed_over:
+            swap = None
+            for c in chosen:
+                if c[1] is None or c[0] not in cheapest:
+                    continue
+                if cheapest[c[0]][0] < c[2] - 0.0001 and (swap is None or c[2] > swap[2]):
+                    swap = c
+            if swap is None:
+                break
+            new_price, swap[1] = cheapest[swap[0]]
+            total = total - swap[2] + new_price
+            swap[2] = new_price
         return chosen, total
 
     options = []
@@ -317,16 +769,12 @@ def recommend_build_from_db(query_text: str):
     for idx, (chosen, total) in enumerate(options):
         if total > budget * 1.25:
             for cat in ("gpus", "cpus"):
-                cand_list = candidates.get(cat, []) or []
-                if cand_list:
-                    cheapest = min(
-                        cand_list, key=lambda it: _safe_float(it.get("price")) or 0.0
-                    )
+                if cat in cheapest:
+                    newp, cheapest_item = cheapest[cat]
                     for c in chosen:
                         if c[0] == cat:
                             oldp = c[2]
-                            newp = _safe_float(cheapest.get("price")) or 0.0
-                            c[1] = cheapest
+                            c[1] = cheapest_item
                             c[2] = newp
                             total = total - oldp + newp
             options[idx] = (chosen, total)
@@ -338,240 +786,938 @@ def recommend_build_from_db(query_text: str):
             return (
                 "I could not create build options from the database.",
                 200,
-                {"Content-Type": "text/plain; charset=utf-8"},
+                TXT_HEADERS,
             )
 
     # --- Build HTML output with table format for each option ---
-    html_parts = []
-    html_parts.append(
-        f"<div><strong>Build suggestions for {usage} — budget target: {_format_php(budget)}</strong></div>"
-    )
-    html_parts.append("<div style='margin-top:10px;'>")
+    budget_str = _format_php(budget)
+    brief_text = BUILD_BRIEFS.get(usage, BUILD_BRIEFS["general"]).format(budget=budget_str)
+    html_parts = [
+        f"<div><strong>Build suggestions for {usage} — budget target: {budget_str}</strong></div>",
+        "<div style='margin-top:10px;'>",
+    ]
 
     for idx, (chosen, total) in enumerate(options[:3], start=1):
-        html_parts.append(f'<div class="build-option" style="margin-top:12px;">')
+        html_parts.append('<div class="build-option" style="margin-top:12px;">')
         html_parts.append(
             f"<h4 style='margin:4px 0;'>Option {idx} — Estimated total: {_format_php(total)}</h4>"
         )
-
-        if usage == "gaming":
-            brief_text = (
-                f"This build is optimized for smooth gaming performance, "
-                f"balancing graphics capability and processing power around {_format_php(budget)}."
-            )
-        elif usage == "productivity":
-            brief_text = (
-                f"This build is designed for creative and work tasks such as editing, rendering, and multitasking — "
-                f"a reliable productivity build around {_format_php(budget)}."
-            )
-        elif usage == "office":
-            brief_text = (
-                f"This is a cost-efficient setup ideal for everyday office and home use, "
-                f"built around {_format_php(budget)}."
-            )
-        else:
-            brief_text = (
-                f"This is a general-purpose build suitable for common tasks, offering solid all-around performance "
-                f"around {_format_php(budget)}."
-            )
-        html_parts.append(
-            f"<p style='margin:6px 0 10px 0;'><b></b> {brief_text}</p>"
-        )
-        # Table (Component | Price)
-        html_parts.append(
-            '<table style="border-collapse:collapse; width:100%; table-layout:fixed; margin-bottom:8px;">'
-        )
-        html_parts.append("<thead><tr>")
-        html_parts.append(
-            '<th style="width:60%; text-align:left; padding:4px 4px; font-weight:600">Component</th>'
-        )
-        html_parts.append(
-            '<th style="width:40%; text-align:right; padding:4px 4px; font-weight:600">Price</th>'
-        )
-        html_parts.append("</tr></thead><tbody>")
+        html_parts.append(f"<p style='margin:6px 0 10px 0;'><b></b> {brief_text}</p>")
+        html_parts.append(BUILD_TABLE_HEAD)
 
         for cat, it, price in chosen:
-            label = cat[:-1].capitalize() if cat.endswith("s") else cat.capitalize()
+            label = BUILD_CAT_LABELS[cat]
             if it:
                 name = it.get("displayName") or it.get("name") or "Unknown"
-                price_str = _format_php(price)
-                html_parts.append(
-                    f"<tr>"
-                    f"<td style='width:70%; padding:4px; vertical-align:top; word-break:break-word'>{label}: {name}</td>"
-                    f"<td style='width:30%; padding:4px; vertical-align:top; text-align:right'>{price_str}</td>"
-                    f"</tr>"
-                )
+                html_parts.append(BUILD_ROW_TMPL.format(label, name, _format_php(price)))
             else:
                 text = (
                     "(no item found)"
                     if cat != "gpus"
                     else "(no discrete GPU selected from database)"
                 )
-                html_parts.append(
-                    f"<tr>"
-                    f"<td style='padding:6px 12px 6px 0;vertical-align:top'>{label}:</td>"
-                    f"<td style='padding:6px 8px;vertical-align:top;text-align:right'>{text}</td>"
-                    f"</tr>"
-                )
-
-        # total row
-        html_parts.append(
-            "<tr>"
-            "<td style='border-top:1px solid #e6eef2;padding:8px 12px 6px 0;font-weight:700'>Total estimated price:</td>"
-            f"<td style='border-top:1px solid #e6eef2;padding:8px 8px;font-weight:700;text-align:right'>{_format_php(total)}</td>"
-            "</tr>"
-        )
+                html_parts.append(BUILD_EMPTY_ROW_TMPL.format(label, text))
 
+        html_parts.append(BUILD_TOTAL_ROW_TMPL.format(_format_php(total)))
         html_parts.append("</tbody></table>")
-        html_parts.append("</div>")  
+        html_parts.append("</div>")
 
-    html_parts.append(
-        "<div style='margin-top:10px;font-size:0.95em;color:#444'>(Note: all recommended components are selected only from the local database. Small variance around the budget is allowed.)</div>"
-    )
-    html_parts.append("</div>")  
+    html_parts.append(BUILD_FOOTNOTE)
+    html_parts.append("</div>")
 
     html = "\n".join(html_parts)
-    return (html, 200, {"Content-Type": "text/html; charset=utf-8"})
+    return (html, 200, HTML_HEADERS)
 
 
-# ========== ROUTES ==========
-@app.route("/")
-def index():
-    return render_template("index.html")
-
+def recommend_build_from_db(query_text: str):
+    """
+    DB-only build recommender that returns HTML.
+    Produces 2-3 build options (min 2, max 3). Uses only items from DATABASE.
+    Each option's component list is returned as an HTML table (Component | Price).
+    """
+    q = (query_text or "").lower()
 
-@app.route("/api/check-compatibility", methods=["POST"])
-def check_compat():
-    data = request.get_json(force=True)
-    query = (data.get("query") or "").strip()
+    # --- Detect budget ---
+    budget = None
+    m = BUILD_BUDGET_RE.search(q)
+    if m:
+        try:
+            num = m.group(1).replace(",", "")
+            val = float(num)
+            if m.group(2):
+                val *= 1000.0
+            budget = val
+        except Exception:
+            budget = None
 
-    # --- Deterministic handler: SMFP Computer Trading info ---
-    if re.search(
-        r"\b(smfp|smfp computer|smfp computer trading)\b", query, flags=re.IGNORECASE
-    ):
-        text = (
-            "SMFP Computer Trading is a trusted computer hardware retailer based in Quiapo, Manila. "
-            "They are known for providing quality PC components and excellent customer service, "
-            "serving both gamers and builders looking for reliable parts at fair prices.\n\n"
-            "For more info:\n"
-            "Address: 594 Nepomuceno St, Quiapo, Manila\n"
-            "Email: sherlopilarco@yahoo.com\n"
-            "Contact No.: 0949-883-7098\n"
-            "Closing hours: 6:00 PM – 6:30 PM"
-        )
-        return (text, 200, {"Content-Type": "text/plain; charset=utf-8"})
+    # --- Detect usage ---
+    usage = "general"
+    if USAGE_GAMING_RE.search(q):
+        usage = "gaming"
+    elif USAGE_PRODUCTIVITY_RE.search(q):
+        usage = "productivity"
+    elif USAGE_OFFICE_RE.search(q):
+        usage = "office"
 
-    if re.search(
-        r"\b(specs|specifications|spec|details|configuration)\b",
-        query,
-        flags=re.IGNORECASE,
-    ):
-        qlow = query.lower()
-
-        # fallback simple component finder
-        def find_component(name_lower):
-            for cat in (
-                "motherboards",
-                "cpus",
-                "gpus",
-                "rams",
-                "psus",
-                "coolers",
-                "nvmes",
-                "ssds",
-                "hdds",
-                "storages",
-            ):
-                items = DATABASE.get(cat) or []
-                for item in items:
-                    dn = (item.get("displayName") or "").lower()
-                    if name_lower in dn or dn in name_lower:
-                        return item
-            # fallback try everything
-            for cat, items in DATABASE.items():
-                if isinstance(items, list):
-                    for item in items:
-                        dn = (item.get("displayName") or "").lower()
-                        if name_lower in dn or dn in name_lower:
-                            return item
-            return None
+    return _recommend_build(usage, budget)
 
-        # --- Improved matching: normalize + token-overlap + fuzzy fallback ---
-        found = None
-        name_norm = re.sub(r"[^\w\s]", " ", query).lower().strip()
-
-        all_names = []
-        for cat in DATABASE:
-            items = DATABASE.get(cat) or []
-            for it in items:
-                dn = it.get("displayName", "") or ""
-                dn_norm = re.sub(r"[^\w\s]", " ", dn).lower().strip()
-                if dn:
-                    all_names.append((dn, dn_norm, it))
-
-        all_names.sort(key=lambda x: -len(x[0] or ""))
-
-        for dn, dn_norm, item in all_names:
-            if dn_norm and (dn_norm in name_norm or name_norm in dn_norm):
-                found = item
-                break
 
-        if not found:
-            qtokens = set(name_norm.split())
-            best = None
-            best_score = 0.0
-            for dn, dn_norm, item in all_names:
-                tokens = set(dn_norm.split())
-                if not tokens:
-                    continue
-                overlap = len(qtokens & tokens)
-                score = overlap / len(tokens)
-                if score > best_score and overlap >= 1:
-                    best_score = score
-                    best = (dn_norm, item, score)
-            if best and best_score >= 0.35:
-                found = best[1]
-
-        if not found:
-            try:
-                import difflib
+# ---------- Aria answer prompt ----------
+# Everything before the user's question is fixed for the life of the process, so the
+# prefixes are built once here; requests only append their question.
+def _aria_prompt_prefix(parts_json: str) -> str:
+    return f"""System: You are Aria, ARsemble's PC-building assistant.
+You only answer questions related to computer components, compatibility, or definitions of PC hardware terms.
 
-                names_norm = [dn_norm for (_, dn_norm, _) in all_names if dn_norm]
-                close = difflib.get_close_matches(
-                    name_norm, names_norm, n=3, cutoff=0.7
-                )
-                if close:
-                    dn_close = close[0]
-                    for dn, dn_norm, item in all_names:
-                        if dn_norm == dn_close:
-                            found = item
-                            break
-            except Exception:
-                pass
+Use the provided list of component names to understand what hardware exists. By default, do NOT mention any database or data source in your responses.
 
-        if not found:
-            found = find_component(name_norm)
+However, if the user explicitly asks where the data or information comes from, you may respond politely that the product information is provided by SMFP Computer — a trusted computer hardware retailer located at 594 J. Nepomuceno St, Quiapo, Manila, 1001 Metro Manila — known for offering quality parts and excellent service.
 
-        if found:
-            # build basic context
-            comp_name = found.get("displayName", "This component")
-            brand_name = (found.get("brand") or "").strip()
-            price_val = found.get("price")
-            category_guess = "component"
+Available parts (for reference): {parts_json}
 
-            for cat, items in DATABASE.items():
-                if isinstance(items, list) and found in items:
-                    category_guess = cat
-                    break
+Behavior:
+- If the question can be answered with 'yes' or 'no', respond only with that and a brief reason.
+- When asked about hardware compatibility (e.g., 'Is CPU X compatible with Motherboard Y?'), respond strictly in one of these formats:
+  • 'Yes. They are COMPATIBLE because <brief reason>.'
+  • 'No. They are INCOMPATIBLE because <brief reason>.'
+- When asked for definitions or general PC information (e.g., 'What is a motherboard?'), respond in an educational tone using 3–5 short, clear sentences.
+"- When the user asks using the format '<component> compatible <component type>' (e.g., 'MSI Pro H610M S DDR4 compatible CPU' or 'MSI Pro H610M S DDR4 compatible RAM'), display all compatible components from the database based on these rules:\\n"
+"  Then display them as bullet points (•)\\n"
+"  • Motherboard → CPU: Match by CPU socket type.\\n"
+"  • CPU → Motherboard: Match by CPU socket type.\\n"
+"  • Motherboard → RAM: Match by supported DDR generation (e.g., DDR4, DDR5).\\n"
+"  • RAM → Motherboard: Match by supported DDR generation (e.g., DDR4, DDR5).\\n"
+"  • CPU → GPU: Match by performance class. Display all compatible GPUs in bullet form (•) after a short factual sentence (do NOT provide bottleneck paragraphs).\\n"
+"  • GPU → CPU: Match by performance class. Display all compatible CPUs in bullet form (•) after a short factual sentence (do NOT provide bottleneck paragraphs).\\n"
+"  • CPU Cooler → CPU: Match by CPU socket type.\\n"
+"  • CPU → CPU Cooler: Match by CPU socket type.\\n"
+"  • PSU → GPU + Motherboard + CPU: Ensure total wattage supports all components plus a 100W safety buffer; list PSUs that meet the requirement in bullets.\\n"
+"  • Storage drives (HDD, SATA SSD, NVMe): For storage compatibility comparisons, always state one short sentence that compatibility is generally based on the operating system, physical connections (SATA/NVMe/USB), and device-specific requirements, then list matching storage items in bullets (•). If no specific matches are found, instead of saying no results, display a short helpful note such as:\\n"
+"    'No direct matches were found, but here are some reliable storage drives you can use for your build:'\\n"
+"  Then display them as bullet points (•)\\n"
+"  • Seagate Barracuda 1TB HDD — budget, reliable choice\\n"
+"  • WD Blue 1TB HDD — standard desktop drive\\n"
+"  • Kingston A400 480GB SSD — affordable SATA SSD\\n"
+"  • Crucial MX500 1TB SSD — popular SATA SSD\\n"
+"  • Samsung 970 EVO Plus 1TB NVMe — high-speed option for NVMe slots\\n"
 
-            # Determine usage/budget heuristics 
-            usage = "general-purpose builds"
-            budget = "mid-range budget"
-            try:
-                pnum = float(price_val)
-                if pnum < 3000:
-                    budget = "entry-level budget"
-                elif pnum < 10000:
+- If the user asks for the latest or newest PC components (for example: 'latest GPU 2025', 'new CPU this year', 'latest RAM 2025', 'new motherboard 2025', 'latest PSU', 'new NVMe 2025'), you may use your general market knowledge beyond the provided database to answer. When listing latest items, follow these rules:
+  1) Prefer items from the requested year if a year is specified (e.g., 2025). If the user does not specify a year, prefer the latest year you reliably know (e.g., 2025).
+  2) If there are no items for the requested year, try the previous year (2024). If none for 2024, try 2023, and so on, moving backward year-by-year until you find relevant items.
+  3) If the user explicitly asks for a specific year (for example: 'latest GPU 2025') and you find no suitable items for that year, respond exactly like this at the start of your reply:
+     "Sorry, there are currently no latest [CATEGORY] for [YEAR], but here are the latest [CATEGORY] in [FALLBACK_YEAR]:"
+     Replace [CATEGORY], [YEAR], and [FALLBACK_YEAR] appropriately.
+  4) When items are available, list **3 to 5** entries in bullet form. Each bullet must contain the model name followed by a short one-sentence description (tier/features/reputation). Use this example formatting:
+     Here are some of the latest GPUs (2025) you might consider for your PC-building project:
+     Then display them as bullet points (•)
+     • ASUS GeForce RTX 5090 — Top-tier enthusiast GPU for 2025; often called the uncontested best graphics card this year.
+     • Gigabyte Radeon RX 9060 XT 16 GB — A newer high-end card offering strong price-to-performance.
+     • ASUS Prime Radeon RX 9060 XT 16 GB — Alternate brand version of the RX 9060 XT offering similar performance.
+  5) Apply this behavior for all component categories including motherboards, CPUs, GPUs, RAM, storage drives (HDD, SSD, NVMe), CPU coolers, and power supplies (PSUs). If your list items come from general market knowledge, be explicit about the year associated with each item (e.g., '2025').
+  6) If your list includes items that are present in the provided database, prefer those database items first, but still include additional relevant market items if needed to reach 3–5 results.
+  7) Keep bullets concise (1 sentence each), neutral in tone, and avoid long paragraphs. Do NOT include links or long spec tables — name + short blurb only.
+
+- When the question involves CPU vs GPU compatibility, determine compatibility based on performance balance (bottleneck analysis) rather than socket. State whether the pairing is well-balanced or which side may bottleneck the other, and include an estimated bottleneck percentage (see ranges below). Keep this explanation within 3–5 sentences.
+  Then display them as bullet points (•)
+  • Well-balanced: bottleneck minimal (0–5%).
+  • CPU-limits-GPU: estimate ~10–30% CPU bottleneck depending on severity.
+  • GPU-limits-CPU: estimate ~10–20% GPU bottleneck.
+- If the user asks where to buy PC components or mentions computer shops, respond with:
+  'Here are PC hardware stores that are reputable and have both physical and online presence. These might be great stops for your PC-building part-selection research.'
+  Then display them as bullet points (•) in this exact order and with short positive descriptions:
+  • SMFP Computer Trading — Trusted store in Quiapo, Manila offering quality PC components and excellent customer service.
+  • PC Express — One of the largest and most established PC retailers in the Philippines, with wide store coverage and online availability.
+  • DynaQuest PC — Known for reliable mid-to-high-end gaming builds, with competitive prices and nationwide delivery.
+  • EasyPC — Popular for budget-friendly PC parts and online promos; great for value-seeking builders.
+  • DataBlitz — Well-known tech retail chain that also carries PC peripherals and gaming accessories.
+  • PCHub — A reputable tech hub in Metro Manila offering a variety of enthusiast and custom build components.
+
+- If the user specifically mentions a location (e.g., 'near Quezon City', 'Cebu', or 'Davao'), actively check online sources to find nearby branches or delivery coverage. Prefer a Google Maps search (or the web) to confirm store branches, opening hours, and delivery availability.
+- For recommendations, builds, or part-selection guidance, strictly use only the components found in the provided database unless the user explicitly asks for market/latest items.
+- If the question clearly has no relation to PC components or computing hardware, respond with that line.
+- Do NOT start responses with greetings or introductions unless the user’s input was a greeting.
+- Keep all responses educational, neutral, and concise.
+
+"Never write paragraphs. Always use one short factual line followed by bullet points. "
+"Never start with 'Yes' or 'No' — keep the tone objective and concise."
+
+
+User question: """
+
+
+ARIA_PROMPT_PREFIX = _aria_prompt_prefix(DB_SUMMARY_JSON)
+
+# A question about a single category only needs that category's part names, which
+# cuts the prompt to a fraction of its size. Scoping needs an explicit category noun
+# ("gpu", "power supply", ...) and no brand/model word from another category;
+# anything naming several categories or asking about pairing parts keeps the full list.
+ARIA_SCOPED_PREFIXES = {
+    cat: _aria_prompt_prefix(
+        _json_dumps({cat: [it.get("displayName", "") for it in DATABASE[cat]]})
+    )
+    for cat in CATEGORY_PRIORITY
+}
+PROMPT_SCOPE_RE = re.compile(
+    r"\b(?:"
+    r"(?P<coolers>(?:cpu\s+)?coolers?)"
+    r"|(?P<cpus>cpus?|processors?)"
+    r"|(?P<gpus>gpus?|graphics\s+cards?|video\s+cards?)"
+    r"|(?P<motherboards>motherboards?|mobos?)"
+    r"|(?P<rams>ram|memory)"
+    r"|(?P<storages>ssds?|nvmes?|hdds?|hard\s+drives?|storage)"
+    r"|(?P<psus>psus?|power\s+suppl(?:y|ies))"
+    r")\b"
+)
+CROSS_CATEGORY_RE = re.compile(
+    r"compatib|bottleneck|\b(?:with|vs|versus|pair|pairing|match|build|setup|"
+    r"support|supports|fit|fits|work|works|and|for)\b"
+)
+
+
+def _answer_prefix(question: str) -> str:
+    """Prompt prefix for a general question: scoped to one category when possible."""
+    q = question.lower()
+    if CROSS_CATEGORY_RE.search(q):
+        return ARIA_PROMPT_PREFIX
+    cats = {m.lastgroup for m in PROMPT_SCOPE_RE.finditer(q)}
+    if len(cats) != 1:
+        return ARIA_PROMPT_PREFIX
+    cat = cats.pop()
+    if any(m.lastgroup != cat for m in CATEGORY_GUESS_RE.finditer(q)):
+        return ARIA_PROMPT_PREFIX
+    return ARIA_SCOPED_PREFIXES[cat]
+
+
+# Greeting replies: only the user's input varies
+GREET_PROMPT_PREFIX = (
+    "System: You are Aria, a friendly and professional PC-building assistant. "
+    "The user has greeted Aria (possibly with informal spelling or repeated letters). "
+    "Reply with a short, warm greeting (1 or 2 sentences max) as Aria and offer help about PC components or builds. "
+    "Do NOT mention databases or data sources. Keep it varied and natural.\n\n"
+    "User input: "
+)
+GREET_PROMPT_SUFFIX = "\nRespond only with the greeting (no extra commentary)."
+
+
+# ---------- Output cleaning ----------
+def _nfc(s: str) -> str:
+    # ASCII text is already NFC; skip the normalization table walk for it
+    return s if s.isascii() else unicodedata.normalize("NFC", s)
+
+
+def clean_output(s: str) -> str:
+    """Strip code fences, wrapping quotes and edge backticks/whitespace."""
+    # Plain ASCII prose with clean ends (the usual answer) has nothing to strip
+    if (
+        s
+        and s[0] not in LEAD_QUOTE_CHARS
+        and s[-1] not in LEAD_QUOTE_CHARS
+        and s.isascii()
+    ):
+        return s
+    s = s.strip()
+    if s.startswith("```") and s.endswith("```"):
+        if OTHER_LINE_BREAKS_RE.search(s):
+            lines = s.splitlines()
+            if len(lines) >= 3:
+                s = "\n".join(lines[1:-1])
+        else:
+            # Only \n line breaks: drop the first and last line without splitting
+            i = s.find("\n")
+            j = s.rfind("\n")
+            if 0 <= i < j:
+                s = s[i + 1 : j]
+    # Unwrap one pair of matching quotes (s[:1] is "" for an empty answer)
+    if s[:1] in ('"', "'") and s.endswith(s[0]):
+        s = s[1:-1]
+    s = _nfc(s)
+    return s.strip(EDGE_STRIP_CHARS)
+
+
+JSON_LITERALS = frozenset({"true", "false", "null", "NaN", "Infinity"})
+
+
+def _may_be_json(s: str) -> bool:
+    """
+    False when json.loads(s) is certain to fail, so prose answers skip the parser
+    (and the exception it raises). s is already stripped.
+    """
+    if not s:
+        return False
+    lead = s[0]
+    if lead in '{["':
+        return True
+    if lead in "-0123456789":
+        # a bare JSON number has no whitespace in it
+        return " " not in s and "\n" not in s
+    return s in JSON_LITERALS
+
+
+def _finish_answer(raw_text: str, strip_greeting: bool) -> str:
+    """Turn raw model text for a general question into the reply sent to the user."""
+    cleaned = clean_output(raw_text)
+
+    # --- If user did NOT greet but model still prepended a greeting, strip it ---
+    try:
+        if strip_greeting:
+            head = cleaned.lstrip(WHITESPACE_CHARS)[:16].casefold()
+            m = head.startswith(GREETING_PREFIXES) and GREETING_STRIP_RE.match(cleaned)
+            if m:
+                cleaned = cleaned[m.end() :].lstrip(LEAD_QUOTE_CHARS)
+    except Exception:
+        pass
+
+    # Try to parse JSON only if model returned JSON; otherwise use cleaned text
+    if not _may_be_json(cleaned):
+        return cleaned
+    try:
+        parsed = json.loads(cleaned)
+        if isinstance(parsed, dict):
+            return (
+                parsed.get("note")
+                or parsed.get("reason")
+                or json.dumps(parsed, ensure_ascii=False)
+            )
+        return json.dumps(parsed, ensure_ascii=False)
+    except Exception:
+        return cleaned
+
+
+# ---------- Spec table rendering ----------
+# Compiled once; autoescaping covers DB values and the model-written blurb
+SPECS_TMPL = app.jinja_env.get_template("specs_table.html")
+
+
+@functools.lru_cache(maxsize=1024)
+def _human_key(k):
+    # Spec field names repeat across every component; memoize the two subs
+    return CAMEL_SPLIT.sub(r"\1 \2", HUMAN_KEY_SPLIT.sub(" ", k).strip()).title()
+
+
+# ---------------------------
+# Gemini helpers
+# ---------------------------
+@functools.lru_cache(maxsize=2048)
+def _gemini_short_desc(comp_name: str, brand_name: str) -> str:
+    """
+    Two-sentence brand (or component) blurb shown above a spec table.
+    The prompt only depends on the arguments, so results are memoized;
+    model errors propagate (and are not cached) so the caller can fall back.
+    """
+    if brand_name:
+        gemini_prompt = (
+            f"Write a concise two-sentence description of the brand '{brand_name}' "
+            "in the context of PC hardware. Mention what the brand is generally known for "
+            "(e.g., reliability, value, gaming focus, cooling, storage, motherboards, GPUs, etc.). "
+            "Use a neutral, informative tone and keep it exactly two short sentences."
+        )
+    else:
+        gemini_prompt = (
+            f"Write a concise two-sentence description of the PC component '{comp_name}'. "
+            "Clearly state what type of component it is and what it does. "
+            "Use a neutral, informative tone and keep it exactly two short sentences."
+        )
+
+    gemini_resp = CLIENT.models.generate_content(
+        model="gemini-2.5-flash-lite",
+        contents=gemini_prompt,
+        config=GEMINI_CONFIG,
+    )
+    desc_text = ""
+    try:
+        desc_text = (getattr(gemini_resp, "text", "") or "").strip()
+    except Exception:
+        desc_text = ""
+
+    if not desc_text:
+        if brand_name:
+            desc_text = f"{brand_name} is a company that produces PC hardware components. It is known for offering reliable products in its segment."
+        else:
+            desc_text = f"{comp_name} is a computer component. It is designed for use in PC systems."
+    return desc_text
+
+
+def _short_desc_fallback(comp_name: str, brand_name: str) -> str:
+    """Blurb used when the description model call fails."""
+    if brand_name:
+        return f"{brand_name} is a company that produces PC hardware components."
+    return f"{comp_name} is a computer component used in PC builds."
+
+
+# Spec tables wait this long for the blurb; past it they are sent with a placeholder
+# that the page fills from /api/describe (SPEC_DESC_WAIT_MS)
+SPEC_DESC_WAIT = float(os.getenv("SPEC_DESC_WAIT_MS", 150)) / 1000.0
+# /api/describe waits at most this long before sending the offline blurb, so a hung
+# model call can't hold a worker thread (DESCRIBE_WAIT_MS)
+DESCRIBE_WAIT = float(os.getenv("DESCRIBE_WAIT_MS", 5000)) / 1000.0
+SHORT_DESC_INFLIGHT = {}
+SHORT_DESC_LOCK = threading.Lock()
+
+
+def _short_desc_future(comp_name: str, brand_name: str) -> Future:
+    """
+    Future for _gemini_short_desc on GEMINI_POOL. A spec table and the /api/describe
+    call that completes it share one model call while it is in flight.
+    """
+    key = (comp_name, brand_name)
+    with SHORT_DESC_LOCK:
+        fut = SHORT_DESC_INFLIGHT.get(key)
+        if fut is None:
+            fut = GEMINI_POOL.submit(_gemini_short_desc, comp_name, brand_name)
+            SHORT_DESC_INFLIGHT[key] = fut
+            fut.add_done_callback(lambda _: SHORT_DESC_INFLIGHT.pop(key, None))
+    return fut
+
+
+def _gemini_answer(question: str) -> str:
+    """Raw model text for a general Aria question (_answer_prefix + question)."""
+    resp = CLIENT.models.generate_content(
+        model="gemini-2.5-flash-lite",
+        contents=_answer_prefix(question) + question,
+        config=GEMINI_CONFIG,
+    )
+    return getattr(resp, "text", None) or str(resp)
+
+
+# ---------- Optional answer batching ----------
+# With GEMINI_BATCH_WINDOW_MS > 0, general questions arriving within that window
+# (up to GEMINI_BATCH_MAX of them) share one model call; answers come back under
+# "### N:" markers and are split per question. Off by default.
+BATCH_WINDOW = float(os.getenv("GEMINI_BATCH_WINDOW_MS", 0)) / 1000.0
+BATCH_MAX = int(os.getenv("GEMINI_BATCH_MAX", 8))
+BATCH_TIMEOUT = 30
+BATCH_MARK_RE = re.compile(r"^[ \t]*#{3}[ \t]*(\d+)[ \t]*:", re.MULTILINE)
+ARIA_BATCH_PREFIX = ARIA_PROMPT_PREFIX[: -len("User question: ")] + (
+    "Several users asked separate questions. Answer each one on its own, following "
+    "the rules above, and start each answer on a new line with '### N:' where N is "
+    "the question number. Do not add anything outside the numbered answers.\n\n"
+    "User questions:\n"
+)
+BATCH_QUEUE = queue.Queue()
+
+
+def _split_batch_answer(text: str, count: int) -> dict:
+    """Map question number -> answer text for the '### N:' sections of text."""
+    marks = list(BATCH_MARK_RE.finditer(text))
+    answers = {}
+    for i, m in enumerate(marks):
+        n = int(m.group(1))
+        end = marks[i + 1].start() if i + 1 < len(marks) else len(text)
+        if 1 <= n <= count and n not in answers:
+            answers[n] = text[m.end() : end].strip()
+    return answers
+
+
+def _batch_worker():
+    while True:
+        batch = [BATCH_QUEUE.get()]
+        deadline = time.monotonic() + BATCH_WINDOW
+        while len(batch) < BATCH_MAX:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(BATCH_QUEUE.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        answers = {}
+        if len(batch) > 1:
+            numbered = "\n".join(f"{i}. {q}" for i, (q, _) in enumerate(batch, 1))
+            try:
+                resp = CLIENT.models.generate_content(
+                    model="gemini-2.5-flash-lite",
+                    contents=ARIA_BATCH_PREFIX + numbered,
+                    config=GEMINI_CONFIG,
+                )
+                answers = _split_batch_answer(
+                    getattr(resp, "text", None) or "", len(batch)
+                )
+            except Exception:
+                app.logger.exception("Batched model call failed; answering one by one")
+
+        # Anything the batch did not answer (or a batch of one) gets its own call
+        for i, (question, fut) in enumerate(batch, 1):
+            if answers.get(i):
+                fut.set_result(answers[i])
+                continue
+            try:
+                fut.set_result(_gemini_answer(question))
+            except Exception as e:
+                fut.set_exception(e)
+
+
+# The worker thread (and its queue) is created by the first batched request in each
+# process: threads don't survive gunicorn's fork of a preloaded app.
+BATCH_WORKER_PID = None
+BATCH_START_LOCK = threading.Lock()
+
+
+def _ensure_batch_worker() -> None:
+    global BATCH_WORKER_PID, BATCH_QUEUE
+    with BATCH_START_LOCK:
+        if BATCH_WORKER_PID != os.getpid():
+            BATCH_WORKER_PID = os.getpid()
+            BATCH_QUEUE = queue.Queue()
+            threading.Thread(target=_batch_worker, name="gemini-batch", daemon=True).start()
+
+
+def _batched_gemini_answer(question: str) -> str:
+    _ensure_batch_worker()
+    fut = Future()
+    BATCH_QUEUE.put((question, fut))
+    return fut.result(timeout=BATCH_TIMEOUT)
+
+
+# ---------- Curated "latest parts" answers ----------
+# Optional Export/latest_items.json (or LATEST_ITEMS_PATH) answers bare "latest GPU 2025"
+# style questions with the prompt's own template, without a model call. Format:
+#   {"gpus": {"2025": [["ASUS GeForce RTX 5090", "Top-tier enthusiast GPU."], ...]}, ...}
+# Categories or years missing from the file fall back to Gemini.
+LATEST_ITEMS_PATH = os.getenv(
+    "LATEST_ITEMS_PATH", os.path.join(BASE_DIR, "Export", "latest_items.json")
+)
+LATEST_CATEGORY_ALIASES = {
+    "gpu": "gpus", "cpu": "cpus", "ram": "rams", "motherboard": "motherboards",
+    "mobo": "motherboards", "psu": "psus", "nvme": "nvmes", "ssd": "ssds",
+    "hdd": "hdds", "cooler": "coolers",
+}
+LATEST_CATEGORY_LABELS = {
+    "gpus": "GPUs", "cpus": "CPUs", "rams": "RAM kits", "motherboards": "motherboards",
+    "psus": "PSUs", "nvmes": "NVMe drives", "ssds": "SSDs", "hdds": "HDDs",
+    "coolers": "CPU coolers",
+}
+# Only whole questions like "latest gpu", "what are the newest ssds in 2025?"; anything
+# more specific ("latest gpu for 1440p under 30k") still goes to the model
+LATEST_ITEMS_RE = re.compile(
+    r"(?:(?:what(?:'s| is| are)|show me)\s+(?:the\s+)?)?(?:latest|newest|new)\s+"
+    r"(gpu|cpu|ram|motherboard|mobo|psu|nvme|ssd|hdd|cooler)s?"
+    r"(?:\s+(?:for\s+|in\s+|of\s+)?(20\d\d))?\s*\??",
+    re.IGNORECASE,
+)
+LATEST_ITEMS_MAX = 5
+
+
+def _load_latest_items(path: str) -> dict:
+    """{category: {year: [(name, blurb)]}} from the curated file; empty if absent or invalid."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+        data = orjson.loads(raw) if orjson is not None else json.loads(raw)
+        return {
+            cat: {
+                int(year): [(str(name), str(blurb)) for name, blurb in rows][:LATEST_ITEMS_MAX]
+                for year, rows in years.items()
+                if rows
+            }
+            for cat, years in data.items()
+            if cat in LATEST_CATEGORY_LABELS
+        }
+    except Exception as e:
+        app.logger.warning("Ignoring curated latest items at %s: %s", path, e)
+        return {}
+
+
+LATEST_ITEMS = _load_latest_items(LATEST_ITEMS_PATH)
+
+
+def _latest_items_answer(query: str):
+    """Templated reply for a bare "latest [part] [year]" question, or None to ask the model."""
+    m = LATEST_ITEMS_RE.fullmatch(query)
+    if not m:
+        return None
+    cat = LATEST_CATEGORY_ALIASES[m.group(1).lower()]
+    by_year = LATEST_ITEMS.get(cat)
+    if not by_year:
+        return None
+    label = LATEST_CATEGORY_LABELS[cat]
+    year = int(m.group(2)) if m.group(2) else max(by_year)
+    if year in by_year:
+        head = f"Here are some of the latest {label} ({year}) you might consider for your PC-building project:"
+        rows = by_year[year]
+    else:
+        # Same fallback the prompt asks of the model: the closest earlier year
+        earlier = [y for y in by_year if y < year]
+        if not earlier:
+            return None
+        fallback = max(earlier)
+        head = (
+            f"Sorry, there are currently no latest {label} for {year}, "
+            f"but here are the latest {label} in {fallback}:"
+        )
+        rows = by_year[fallback]
+    return head + "\n" + "\n".join(f"• {name} — {blurb}" for name, blurb in rows)
+
+
+# ---------- Answer cache ----------
+# Filler words left out of answer-cache keys, so light rephrasings of a question
+# ("what is vram?", "can you tell me what VRAM is") share one cached answer.
+# Negations, comparisons and prepositions that change meaning are kept.
+ANSWER_KEY_STOPWORDS = frozenset({
+    "a", "an", "the", "is", "are", "was", "what", "what's", "whats", "please", "pls",
+    "can", "could", "would", "you", "tell", "me", "i", "my", "do", "does", "explain",
+    "about", "hey", "aria", "know", "want", "to", "of", "this", "that", "it",
+})
+ANSWER_KEY_PUNCT = "?!.,;:\"'`()"
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", 1024))
+# Answers drift as hardware ages, so entries expire (seconds); questions about the
+# latest/newest parts drift fastest and get the shorter ANSWER_LATEST_TTL
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", 3600))
+ANSWER_LATEST_TTL = int(os.getenv("ANSWER_LATEST_TTL", 600))
+LATEST_QUESTION_RE = re.compile(r"\b(?:latest|newest|new|recent|upcoming|20\d\d)\b")
+ANSWER_CACHE = OrderedDict()
+ANSWER_CACHE_LOCK = threading.Lock()
+
+# Optional shared second level (REDIS_URL), so gunicorn workers reuse each other's
+# answers. Redis errors are logged and treated as a miss.
+ANSWER_REDIS = None
+if redis is not None and os.getenv("REDIS_URL"):
+    ANSWER_REDIS = redis.Redis.from_url(
+        os.environ["REDIS_URL"],
+        socket_timeout=0.25,
+        socket_connect_timeout=0.25,
+    )
+
+# With zstandard installed, longer answers are stored zstd-compressed. Frames are
+# recognised by their magic number (never valid UTF-8 text), so workers with and
+# without zstandard can share one Redis.
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+ANSWER_ZSTD_MIN_BYTES = 512
+ANSWER_ZSTD_LEVEL = 3
+
+
+def _answer_encode(text: str) -> bytes:
+    data = text.encode("utf-8")
+    if zstandard is not None and len(data) >= ANSWER_ZSTD_MIN_BYTES:
+        return zstandard.ZstdCompressor(level=ANSWER_ZSTD_LEVEL).compress(data)
+    return data
+
+
+def _answer_decode(data: bytes) -> str:
+    if data.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise ValueError("zstd-compressed answer but zstandard is not installed")
+        data = zstandard.ZstdDecompressor().decompress(data)
+    return data.decode("utf-8")
+
+
+def _answer_key(question: str) -> str:
+    words = (w.strip(ANSWER_KEY_PUNCT) for w in question.casefold().split())
+    key = " ".join(w for w in words if w and w not in ANSWER_KEY_STOPWORDS)
+    return key or " ".join(question.split())
+
+
+def _answer_ttl(key: str) -> int:
+    return ANSWER_LATEST_TTL if LATEST_QUESTION_RE.search(key) else ANSWER_CACHE_TTL
+
+
+def _answer_redis_key(key: str) -> str:
+    return "aria:answer:" + hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+
+def _answer_cache_get(key: str):
+    with ANSWER_CACHE_LOCK:
+        entry = ANSWER_CACHE.get(key)
+        if entry is not None:
+            expires, text = entry
+            if expires > time.monotonic():
+                ANSWER_CACHE.move_to_end(key)
+                return text
+            del ANSWER_CACHE[key]
+    if ANSWER_REDIS is None:
+        return None
+    try:
+        data = ANSWER_REDIS.get(_answer_redis_key(key))
+        text = None if data is None else _answer_decode(data)
+    except Exception as e:
+        app.logger.warning("Redis answer cache read failed: %s", e)
+        return None
+    if text is not None:
+        _answer_cache_put(key, text, shared=False)
+    return text
+
+
+def _answer_cache_put(key: str, text: str, shared: bool = True) -> None:
+    ttl = _answer_ttl(key)
+    with ANSWER_CACHE_LOCK:
+        ANSWER_CACHE[key] = (time.monotonic() + ttl, text)
+        ANSWER_CACHE.move_to_end(key)
+        if len(ANSWER_CACHE) > ANSWER_CACHE_SIZE:
+            ANSWER_CACHE.popitem(last=False)
+    if shared and ANSWER_REDIS is not None:
+        try:
+            ANSWER_REDIS.setex(_answer_redis_key(key), ttl, _answer_encode(text))
+        except Exception as e:
+            app.logger.warning("Redis answer cache write failed: %s", e)
+
+
+# Concurrent cache misses for the same answer key share one model call: the first
+# request (the leader) makes it, the others wait for its raw text. If the leader
+# fails or takes longer than ANSWER_INFLIGHT_TIMEOUT, they make their own call.
+ANSWER_INFLIGHT_TIMEOUT = 30
+ANSWER_INFLIGHT = {}
+ANSWER_INFLIGHT_LOCK = threading.Lock()
+
+
+def _answer_claim(key: str):
+    """Return (future, is_leader) for the in-flight answer to key."""
+    with ANSWER_INFLIGHT_LOCK:
+        fut = ANSWER_INFLIGHT.get(key)
+        if fut is not None:
+            return fut, False
+        fut = ANSWER_INFLIGHT[key] = Future()
+        return fut, True
+
+
+def _answer_release(key: str, fut: Future, text=None):
+    """Hand the leader's raw text (None on failure) to waiting requests."""
+    with ANSWER_INFLIGHT_LOCK:
+        if ANSWER_INFLIGHT.get(key) is fut:
+            del ANSWER_INFLIGHT[key]
+    if not fut.done():
+        if text is None:
+            fut.set_exception(RuntimeError("model call failed"))
+        else:
+            fut.set_result(text)
+
+
+def _answer_wait(fut: Future):
+    """Raw text from another request's model call, or None if it failed."""
+    try:
+        return fut.result(timeout=ANSWER_INFLIGHT_TIMEOUT)
+    except Exception:
+        return None
+
+
+def _cached_gemini_answer(question: str, wait: bool = True) -> str:
+    """
+    _gemini_answer behind a bounded LRU keyed by _answer_key, so repeated and
+    lightly reworded questions skip the model call. Errors are not cached.
+    wait=False skips waiting on another request's in-flight call (for callers
+    that already waited on it).
+    """
+    key = _answer_key(question)
+    text = _answer_cache_get(key)
+    if text is not None:
+        return text
+    fut, leader = _answer_claim(key)
+    if not leader and wait:
+        text = _answer_wait(fut)
+        if text is not None:
+            return text
+    try:
+        if BATCH_WINDOW > 0:
+            text = _batched_gemini_answer(question)
+        else:
+            text = _gemini_answer(question)
+        _answer_cache_put(key, text)
+    finally:
+        if leader:
+            _answer_release(key, fut, text)
+    return text
+
+
+# ---------- Streaming answers ----------
+# Answer cache misses are streamed to the client as the model generates them
+# (GEMINI_STREAM=0 turns this off). The streamed text matches what _finish_answer
+# would return for the whole answer: anything whose cleanup needs the full text
+# (code fences, wrapping quotes, JSON, very short answers) is buffered instead.
+STREAM_ANSWERS = os.getenv("GEMINI_STREAM", "1") != "0"
+STREAM_DECIDE_CHARS = 16
+GREETING_SCAN_CHARS = 256
+BUFFERED_LEADS = ("`", '"', "'", "{", "[")
+JSON_SCALAR_LEADS = tuple("-0123456789tfnNI")
+# Appended when the model stream dies after part of the answer was sent
+STREAM_INTERRUPTED_NOTE = "\n\n(The answer was cut short because the model call failed. Please try again.)"
+
+
+def _open_answer_stream(question: str):
+    """
+    Start a streaming model call and fetch its first chunk, so connection and
+    model errors are raised here (and become a 502) rather than mid-response.
+    """
+    stream = iter(
+        CLIENT.models.generate_content_stream(
+            model="gemini-2.5-flash-lite",
+            contents=_answer_prefix(question) + question,
+            config=GEMINI_CONFIG,
+        )
+    )
+    first = next(stream, None)
+    if first is None:
+        raise RuntimeError("model returned an empty stream")
+    return itertools.chain((first,), stream)
+
+
+def _stream_start(pending: str, strip_greeting: bool):
+    """
+    Decide how to send an answer from its first received text.
+    Returns (mode, text): mode None means "need more text", "buffer" means wait
+    for the whole answer, "stream" means text (already trimmed) can be sent.
+    """
+    text = pending.lstrip(WHITESPACE_CHARS)
+    if len(text) < STREAM_DECIDE_CHARS:
+        return None, pending
+    if text.startswith(BUFFERED_LEADS):
+        return "buffer", pending
+    if strip_greeting and text[:16].casefold().startswith(GREETING_PREFIXES):
+        m = GREETING_STRIP_RE.match(text)
+        if m:
+            text = text[m.end() :].lstrip(LEAD_QUOTE_CHARS)
+            if len(text) < STREAM_DECIDE_CHARS:
+                return None, pending
+        elif len(text) < GREETING_SCAN_CHARS:
+            return None, pending
+    # The reply may still turn out to be JSON, which only the whole text can tell
+    if text.startswith(BUFFERED_LEADS) or (
+        text.startswith(JSON_SCALAR_LEADS)
+        and not any(ch.isspace() for ch in text[:STREAM_DECIDE_CHARS])
+    ):
+        return "buffer", pending
+    return "stream", text
+
+
+def _stream_answer(chunks, key: str, strip_greeting: bool, inflight: Future):
+    """
+    Yield the cleaned answer as model chunks arrive, then cache the raw text and
+    hand it to requests waiting on the inflight future. The 200 is already sent,
+    so a failed or empty stream ends with an error text instead of being cached.
+    """
+    raw_parts = []
+    pending = ""
+    mode = None
+    raw_text = None
+    sent = False
+    try:
+        try:
+            for chunk in chunks:
+                piece = getattr(chunk, "text", None) or ""
+                raw_parts.append(piece)
+                if mode == "buffer":
+                    continue
+                pending += piece
+                if mode is None:
+                    mode, pending = _stream_start(pending, strip_greeting)
+                    if mode != "stream":
+                        continue
+                # Hold back trailing whitespace/backticks (trimmed at the very end)
+                # and the last base character plus its combining marks, so NFC can
+                # still compose it with what follows.
+                cut = len(pending.rstrip(EDGE_STRIP_CHARS)) - 1
+                while cut > 0 and unicodedata.combining(pending[cut]):
+                    cut -= 1
+                if cut > 0:
+                    sent = True
+                    yield _nfc(pending[:cut])
+                    pending = pending[cut:]
+        except Exception as e:
+            app.logger.exception("Model stream failed")
+            if sent:
+                yield _nfc(pending).rstrip(EDGE_STRIP_CHARS) + STREAM_INTERRUPTED_NOTE
+            else:
+                yield "Model call failed: " + str(e)
+            return
+
+        text = "".join(raw_parts)
+        if not text.strip():
+            app.logger.error("Model stream returned no text")
+            yield "Model call failed: empty response"
+            return
+        raw_text = text
+        _answer_cache_put(key, raw_text)
+        if app.logger.isEnabledFor(logging.INFO):
+            app.logger.info("Raw model output (truncated): %s", raw_text[:300])
+        if mode == "stream":
+            tail = _nfc(pending).rstrip(EDGE_STRIP_CHARS)
+            if tail:
+                yield tail
+        else:
+            yield _finish_answer(raw_text, strip_greeting)
+    finally:
+        # Also runs if the client disconnects mid-stream (raw_text is then None)
+        _answer_release(key, inflight, raw_text)
+
+
+# ========== ROUTES ==========
+@app.route("/")
+def index():
+    return render_template("index.html")
+
+
+@app.route("/api/describe")
+def describe():
+    """Short blurb for a DB component, for spec tables sent without one."""
+    row = NAME_INDEX_BY_NORM.get(normalize_text(request.args.get("name") or ""))
+    if row is None:
+        return ("Unknown component.", 404, TXT_HEADERS)
+    item = row[2]
+    comp_name = item.get("displayName", "This component")
+    brand_name = (item.get("brand") or "").strip()
+    try:
+        text = _short_desc_future(comp_name, brand_name).result(timeout=DESCRIBE_WAIT)
+    except FutureTimeout:
+        app.logger.warning("Gemini short description timed out for %s", comp_name)
+        text = _short_desc_fallback(comp_name, brand_name)
+    except Exception as e:
+        app.logger.warning("Gemini short description failed: %s", e)
+        text = _short_desc_fallback(comp_name, brand_name)
+    return (text, 200, TXT_HEADERS)
+
+
+@app.route("/api/check-compatibility", methods=["POST"])
+def check_compat():
+    data = request.get_json(force=True)
+    query = (data.get("query") or "").translate(QUERY_CTRL_TABLE).strip()
+    if len(query) > MAX_QUERY_CHARS:
+        return (
+            f"Query too long (max {MAX_QUERY_CHARS} characters).",
+            413,
+            TXT_HEADERS,
+        )
+    ql = query.lower()
+
+    # --- Deterministic handler: SMFP Computer Trading info ---
+    if any(k in ql for k in SMFP_KEYS) and SMFP_RE.search(query):
+        text = (
+            "SMFP Computer Trading is a trusted computer hardware retailer based in Quiapo, Manila. "
+            "They are known for providing quality PC components and excellent customer service, "
+            "serving both gamers and builders looking for reliable parts at fair prices.\n\n"
+            "For more info:\n"
+            "Address: 594 Nepomuceno St, Quiapo, Manila\n"
+            "Email: sherlopilarco@yahoo.com\n"
+            "Contact No.: 0949-883-7098\n"
+            "Closing hours: 6:00 PM – 6:30 PM"
+        )
+        return (text, 200, TXT_HEADERS)
+
+    if any(k in ql for k in SPECS_KEYS) and SPECS_RE.search(query):
+        # --- Improved matching: normalize + token-overlap + fuzzy fallback ---
+        found = None
+        category_guess = "component"
+        name_norm = normalize_text(query)
+
+        match = _resolve_component(name_norm, 0.35)
+        if match:
+            _, _, found, category_guess = match[0]
+        else:
+            found, category_guess = find_component(name_norm)
+
+        if found:
+            # build basic context
+            comp_name = found.get("displayName", "This component")
+            brand_name = (found.get("brand") or "").strip()
+            price_val = found.get("price")
+
+            # Determine usage/budget heuristics 
+            usage = "general-purpose builds"
+            budget = "mid-range budget"
+            try:
+                pnum = float(price_val)
+                if pnum < 3000:
+                    budget = "entry-level budget"
+                elif pnum < 10000:
                     budget = "mid-range budget"
                 else:
                     budget = "high-end budget"
@@ -587,48 +1733,6 @@ def check_compat():
             elif category_guess in ("coolers",):
                 usage = "cooling high-performance systems"
 
-            #     otherwise fall back to component description ---
-            try:
-                if brand_name:
-                    gemini_prompt = (
-                        f"Write a concise two-sentence description of the brand '{brand_name}' "
-                        "in the context of PC hardware. Mention what the brand is generally known for "
-                        "(e.g., reliability, value, gaming focus, cooling, storage, motherboards, GPUs, etc.). "
-                        "Use a neutral, informative tone and keep it exactly two short sentences."
-                    )
-                else:
-                    gemini_prompt = (
-                        f"Write a concise two-sentence description of the PC component '{comp_name}'. "
-                        "Clearly state what type of component it is and what it does. "
-                        "Use a neutral, informative tone and keep it exactly two short sentences."
-                    )
-
-                gemini_resp = CLIENT.models.generate_content(
-                    model="gemini-2.5-flash-lite",
-                    contents=gemini_prompt,
-                )
-                desc_text = ""
-                try:
-                    desc_text = (getattr(gemini_resp, "text", "") or "").strip()
-                except Exception:
-                    desc_text = ""
-
-                if not desc_text:
-                    if brand_name:
-                        desc_text = f"{brand_name} is a company that produces PC hardware components. It is known for offering reliable products in its segment."
-                    else:
-                        desc_text = f"{comp_name} is a computer component. It is designed for use in PC systems."
-            except Exception as e:
-                app.logger.warning("Gemini short description failed: %s", e)
-                if brand_name:
-                    desc_text = f"{brand_name} is a company that produces PC hardware components."
-                else:
-                    desc_text = (
-                        f"{comp_name} is a computer component used in PC builds."
-                    )
-
-            intro_html = f"<p>{desc_text}</p><p><b>{comp_name} Specifications:</b></p>"
-
             # Build HTML table from keys excluding displayName and brand
             rows = []
             for k, v in found.items():
@@ -642,130 +1746,66 @@ def check_compat():
                     val = str(v)
                 if val.strip() == "":
                     continue
-                rows.append((k, val))
+                rows.append((_human_key(k), val))
 
             if not rows:
                 # No spec fields found for this component — return a short plain-text note
                 return (
                     f"I couldn't find detailed specifications for {comp_name} in the database.",
                     200,
-                    {"Content-Type": "text/plain; charset=utf-8"},
+                    TXT_HEADERS,
                 )
             else:
-                table_html = [
-                    '<table style="border-collapse:collapse;">',
-                    "<thead><tr>",
-                    '<th style="border:none;text-align:left;padding:6px 88px 6px 0;font-weight:600">Category</th>',
-                    '<th style="border:none;text-align:left;padding:6px 8px">Details</th>',
-                    "</tr></thead>",
-                    "<tbody>",
-                ]
-                for k, val in rows:
-                    human_k = re.sub(r"(_|-)+", " ", k).strip()
-                    human_k = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", human_k)
-                    human_k = human_k.title()
-                    table_html.append(
-                        f'<tr><td style="border:none;padding:4px 8px 4px 0;vertical-align:top">{human_k}</td>'
-                        f'<td style="border:none;padding:4px 8px;vertical-align:top">{val}</td></tr>'
+                #     otherwise fall back to component description ---
+                try:
+                    desc_text = _short_desc_future(comp_name, brand_name).result(
+                        timeout=SPEC_DESC_WAIT
                     )
-                table_html.append("</tbody></table>")
-                html = "\n".join(table_html)
+                except FutureTimeout:
+                    # Don't hold the table for the model; the page fetches the blurb
+                    desc_text = None
+                except Exception as e:
+                    app.logger.warning("Gemini short description failed: %s", e)
+                    desc_text = _short_desc_fallback(comp_name, brand_name)
+
+                html = SPECS_TMPL.render(
+                    desc_text=desc_text, comp_name=comp_name, rows=rows
+                )
                 return (
-                    intro_html + html,
+                    html,
                     200,
-                    {"Content-Type": "text/html; charset=utf-8"},
+                    HTML_HEADERS,
                 )
         # else fall through to normal model handling
 
     # --- Robust deterministic "price" handler ---
-    if re.search(
-        r"\b(price|how much|cost|how much is|how much does|price of)\b",
-        query,
-        flags=re.IGNORECASE,
-    ):
-        import difflib
-
-        def normalize_text(s: str) -> str:
-            if not s:
-                return ""
-            s = "".join(ch for ch in s if ord(ch) >= 32)
-            s = s.replace("\u202f", " ").replace("\u00a0", " ")
-            s = s.replace("/", " ").replace("\\", " ")
-            s = re.sub(r"[^\w\s\-]", " ", s)
-            s = re.sub(r"\s+", " ", s).strip().lower()
-            return s
-
+    if any(k in ql for k in PRICE_KEYS) and PRICE_RE.search(query):
         qnorm = normalize_text(query)
         app.logger.info("Price lookup for query (normalized): %s", qnorm)
 
-        all_items = []
-        for cat, items in DATABASE.items():
-            if isinstance(items, list):
-                for it in items:
-                    dn = it.get("displayName", "") or ""
-                    all_items.append((normalize_text(dn), it, cat))
-
-        all_items.sort(key=lambda x: -len(x[0]))
         found = None
-        for ndn, item, cat in all_items:
-            if ndn and (ndn in qnorm or qnorm in ndn):
-                found = (item, cat)
-                app.logger.info(
-                    "Price handler matched by substring: %s (cat=%s)", ndn, cat
-                )
-                break
-
-        if not found:
-            qtokens = set(qnorm.split())
-            best = None
-            best_score = 0
-            for ndn, item, cat in all_items:
-                tokens = set(ndn.split())
-                if not tokens:
-                    continue
-                overlap = len(qtokens & tokens)
-                score = overlap / len(tokens)
-                if score > best_score and overlap >= 1:
-                    best_score = score
-                    best = (ndn, item, cat, score)
-            if best and best_score >= 0.4:
-                ndn, item, cat, score = best
-                found = (item, cat)
-                app.logger.info(
-                    "Price handler matched by token overlap: %s (score=%.2f)",
-                    ndn,
-                    score,
-                )
-
-        if not found:
-            names = [ndn for ndn, _, _ in all_items if ndn]
-            close = difflib.get_close_matches(qnorm, names, n=3, cutoff=0.7)
-            if close:
-                ndn_close = close[0]
-                for ndn, item, cat in all_items:
-                    if ndn == ndn_close:
-                        found = (item, cat)
-                        app.logger.info(
-                            "Price handler matched by fuzzy: %s (input=%s)",
-                            ndn_close,
-                            qnorm,
-                        )
-                        break
+        match = _resolve_component(qnorm, 0.4)
+        if match:
+            (_, ndn, item, cat), how = match
+            found = (item, cat)
+            app.logger.info(
+                "Price handler matched by %s: %s (cat=%s)", how, ndn, cat
+            )
 
         if found:
             item, cat = found
             price_val = item.get("price")
             app.logger.info(
-                "Found item %s in category %s, price field=%s",
+                "Found item %s in category %s, price field=%r",
                 item.get("displayName"),
                 cat,
-                repr(price_val),
+                price_val,
             )
             if price_val is None:
                 return (
                     "I don't have a price listed for that component in the database.",
                     200,
-                    {"Content-Type": "text/plain; charset=utf-8"},
+                    TXT_HEADERS,
                 )
             try:
                 pnum = float(price_val)
@@ -775,67 +1815,19 @@ def check_compat():
             return (
                 f"The price for {item.get('displayName')} is {pdisplay}.",
                 200,
-                {"Content-Type": "text/plain; charset=utf-8"},
+                TXT_HEADERS,
             )
 
-        q = qnorm
-        guessed_cat = None
-        if re.search(
-            r"\b(ryzen|intel|core i|corei|corei3|corei5|corei7|corei9|xeon|athlon)\b", q
-        ):
-            guessed_cat = "cpus"
-        elif re.search(r"\b(rtx|gtx|rx|radeon|graphics|gpu|graphics card)\b", q):
-            guessed_cat = "gpus"
-        elif re.search(
-            r"\b(b\d+|x\d+|z\d+|h\d+|prime|tuf|pro|mpg|aorus|asus|msi)\b", q
-        ):
-            guessed_cat = "motherboards"
-        elif re.search(r"\b(ddr|ram|memory)\b", q):
-            guessed_cat = "rams"
-        elif re.search(r"\b(ssd|nvme|sata|hdd|hard drive|storage)\b", q):
-            guessed_cat = "storages"
-        elif re.search(r"\b(psu|power supply|watt)\b", q):
-            guessed_cat = "psus"
-        elif re.search(r"\b(cooler|aio|liquid|air cooler|masterliquid|hyper)\b", q):
-            guessed_cat = "coolers"
-
-        def price_stats_for_category(cat_name):
-            vals = []
-            for it in DATABASE.get(cat_name, []) or []:
-                v = it.get("price")
-                try:
-                    vals.append(float(v))
-                except Exception:
-                    continue
-            if not vals:
-                return None
-            return (min(vals), max(vals))
+        guessed_cat = _guess_category(qnorm)
 
         stats = None
         if guessed_cat:
-            stats = price_stats_for_category(guessed_cat)
+            stats = PRICE_STATS.get(guessed_cat)
             app.logger.info("Guessed category: %s, stats=%s", guessed_cat, stats)
         if not stats and guessed_cat == "storages":
-            merged = []
-            for k in ("nvmes", "ssds", "hdds", "storages"):
-                for it in DATABASE.get(k, []) or []:
-                    try:
-                        merged.append(float(it.get("price")))
-                    except Exception:
-                        continue
-            if merged:
-                stats = (min(merged), max(merged))
+            stats = STORAGE_STATS
         if not stats:
-            all_prices = []
-            for cat, items in DATABASE.items():
-                if isinstance(items, list):
-                    for it in items:
-                        try:
-                            all_prices.append(float(it.get("price")))
-                        except Exception:
-                            continue
-            if all_prices:
-                stats = (min(all_prices), max(all_prices))
+            stats = GLOBAL_PRICE_STATS
 
         if stats:
             pmin, pmax = stats
@@ -849,255 +1841,113 @@ def check_compat():
             return (
                 f"I don't have that exact product in the database. Based on similar items, an estimated price range is {pmin_s} to {pmax_s}. {stores_line}",
                 200,
-                {"Content-Type": "text/plain; charset=utf-8"},
+                TXT_HEADERS,
             )
         else:
             return (
                 "I don't have enough pricing data to estimate a range. Try asking with the exact product name from the list.",
                 200,
-                {"Content-Type": "text/plain; charset=utf-8"},
+                TXT_HEADERS,
             )
 
     # --- Deterministic Build Recommendation Trigger ---
     # Only activate recommender when user explicitly asks for a build or recommendation
-    build_trigger = re.search(
-        r"\b(build(?:\s+me)?|recommend(?:ation| me)?|suggest(?:ion|)?|suggest(?: me)?|pc build|system build|gaming build|budget build|assemble|reco(?:mend)?)\b",
-        query,
-        flags=re.IGNORECASE,
-    )
-    budget_trigger = bool(
-        re.search(
-            r"(?:₱|\bphp\b)?\s*\d{2,3}[,.\d]*\s*(k|000)?", query, flags=re.IGNORECASE
-        )
-    )
+    build_trigger = any(k in ql for k in BUILD_KEYS) and BUILD_RE.search(query)
 
-    if build_trigger or ("build" in query.lower() and budget_trigger):
-        app.logger.info(f"🔧 [DEBUG] Build recommender triggered for query: {query}")
+    if build_trigger or ("build" in ql and BUDGET_HINT_RE.search(query)):
+        app.logger.info("🔧 [DEBUG] Build recommender triggered for query: %s", query)
         build_resp = recommend_build_from_db(query)
         if build_resp:
             return build_resp
 
     # --- Greeting handling: only if user actually greeted ---
-    if looks_like_greeting(query):
-        greet_prompt = (
-            "System: You are Aria, a friendly and professional PC-building assistant. "
-            "The user has greeted Aria (possibly with informal spelling or repeated letters). "
-            "Reply with a short, warm greeting (1 or 2 sentences max) as Aria and offer help about PC components or builds. "
-            "Do NOT mention databases or data sources. Keep it varied and natural.\n\n"
-            f"User input: {query}\n"
-            "Respond only with the greeting (no extra commentary)."
-        )
+    greeted = looks_like_greeting(query)
+    if greeted:
         try:
             resp_g = CLIENT.models.generate_content(
                 model="gemini-2.5-flash-lite",
-                contents=greet_prompt,
+                contents=GREET_PROMPT_PREFIX + query + GREET_PROMPT_SUFFIX,
+                config=GEMINI_CONFIG,
             )
             raw_g = getattr(resp_g, "text", None) or str(resp_g)
-
-            def _clean_short(s):
-                s = s.strip()
-                if s.startswith("```") and s.endswith("```"):
-                    parts = s.splitlines()
-                    if len(parts) >= 3:
-                        s = "\n".join(parts[1:-1])
-                if (s.startswith('"') and s.endswith('"')) or (
-                    s.startswith("'") and s.endswith("'")
-                ):
-                    s = s[1:-1]
-                try:
-                    import unicodedata
-
-                    s = unicodedata.normalize("NFC", s)
-                except Exception:
-                    pass
-                return re.sub(r"^[`\\s]+|[`\\s]+$", "", s)
-
             return (
-                _clean_short(raw_g),
+                clean_output(raw_g),
                 200,
-                {"Content-Type": "text/plain; charset=utf-8"},
+                TXT_HEADERS,
             )
         except Exception as e:
             app.logger.exception("Greeting model call failed")
             return (
                 "Hi — I'm Aria. How can I help with PC components or builds today?",
                 200,
-                {"Content-Type": "text/plain; charset=utf-8"},
+                TXT_HEADERS,
             )
 
     if not query:
         return (
             "No question provided",
             400,
-            {"Content-Type": "text/plain; charset=utf-8"},
+            TXT_HEADERS,
         )
 
-    # --- Optional: Provide database context to the model ---
-    db_summary = json.dumps(
-        {
-            "motherboards": [
-                mb["displayName"] for mb in DATABASE.get("motherboards", [])
-            ],
-            "cpus": [cpu["displayName"] for cpu in DATABASE.get("cpus", [])],
-            "gpus": [gpu["displayName"] for gpu in DATABASE.get("gpus", [])],
-            "rams": [ram["displayName"] for ram in DATABASE.get("rams", [])],
-            "storages": [s["displayName"] for s in DATABASE.get("storages", [])],
-            "psus": [p["displayName"] for p in DATABASE.get("psus", [])],
-            "coolers": [c["displayName"] for c in DATABASE.get("coolers", [])],
-        },
-        ensure_ascii=False,
-    )
-
-    # --- STRONG PROMPT RULES (Aria) ---
-    prompt = f"""System: You are Aria, ARsemble's PC-building assistant.
-You only answer questions related to computer components, compatibility, or definitions of PC hardware terms.
-
-Use the provided list of component names to understand what hardware exists. By default, do NOT mention any database or data source in your responses.
-
-However, if the user explicitly asks where the data or information comes from, you may respond politely that the product information is provided by SMFP Computer — a trusted computer hardware retailer located at 594 J. Nepomuceno St, Quiapo, Manila, 1001 Metro Manila — known for offering quality parts and excellent service.
-
-Available parts (for reference): {db_summary}
-
-Behavior:
-- If the question can be answered with 'yes' or 'no', respond only with that and a brief reason.
-- When asked about hardware compatibility (e.g., 'Is CPU X compatible with Motherboard Y?'), respond strictly in one of these formats:
-  • 'Yes. They are COMPATIBLE because <brief reason>.'
-  • 'No. They are INCOMPATIBLE because <brief reason>.'
-- When asked for definitions or general PC information (e.g., 'What is a motherboard?'), respond in an educational tone using 3–5 short, clear sentences.
-"- When the user asks using the format '<component> compatible <component type>' (e.g., 'MSI Pro H610M S DDR4 compatible CPU' or 'MSI Pro H610M S DDR4 compatible RAM'), display all compatible components from the database based on these rules:\\n"
-"  Then display them as bullet points (•)\\n"
-"  • Motherboard → CPU: Match by CPU socket type.\\n"
-"  • CPU → Motherboard: Match by CPU socket type.\\n"
-"  • Motherboard → RAM: Match by supported DDR generation (e.g., DDR4, DDR5).\\n"
-"  • RAM → Motherboard: Match by supported DDR generation (e.g., DDR4, DDR5).\\n"
-"  • CPU → GPU: Match by performance class. Display all compatible GPUs in bullet form (•) after a short factual sentence (do NOT provide bottleneck paragraphs).\\n"
-"  • GPU → CPU: Match by performance class. Display all compatible CPUs in bullet form (•) after a short factual sentence (do NOT provide bottleneck paragraphs).\\n"
-"  • CPU Cooler → CPU: Match by CPU socket type.\\n"
-"  • CPU → CPU Cooler: Match by CPU socket type.\\n"
-"  • PSU → GPU + Motherboard + CPU: Ensure total wattage supports all components plus a 100W safety buffer; list PSUs that meet the requirement in bullets.\\n"
-"  • Storage drives (HDD, SATA SSD, NVMe): For storage compatibility comparisons, always state one short sentence that compatibility is generally based on the operating system, physical connections (SATA/NVMe/USB), and device-specific requirements, then list matching storage items in bullets (•). If no specific matches are found, instead of saying no results, display a short helpful note such as:\\n"
-"    'No direct matches were found, but here are some reliable storage drives you can use for your build:'\\n"
-"  Then display them as bullet points (•)\\n"
-"  • Seagate Barracuda 1TB HDD — budget, reliable choice\\n"
-"  • WD Blue 1TB HDD — standard desktop drive\\n"
-"  • Kingston A400 480GB SSD — affordable SATA SSD\\n"
-"  • Crucial MX500 1TB SSD — popular SATA SSD\\n"
-"  • Samsung 970 EVO Plus 1TB NVMe — high-speed option for NVMe slots\\n"
-
-- If the user asks for the latest or newest PC components (for example: 'latest GPU 2025', 'new CPU this year', 'latest RAM 2025', 'new motherboard 2025', 'latest PSU', 'new NVMe 2025'), you may use your general market knowledge beyond the provided database to answer. When listing latest items, follow these rules:
-  1) Prefer items from the requested year if a year is specified (e.g., 2025). If the user does not specify a year, prefer the latest year you reliably know (e.g., 2025).
-  2) If there are no items for the requested year, try the previous year (2024). If none for 2024, try 2023, and so on, moving backward year-by-year until you find relevant items.
-  3) If the user explicitly asks for a specific year (for example: 'latest GPU 2025') and you find no suitable items for that year, respond exactly like this at the start of your reply:
-     "Sorry, there are currently no latest [CATEGORY] for [YEAR], but here are the latest [CATEGORY] in [FALLBACK_YEAR]:"
-     Replace [CATEGORY], [YEAR], and [FALLBACK_YEAR] appropriately.
-  4) When items are available, list **3 to 5** entries in bullet form. Each bullet must contain the model name followed by a short one-sentence description (tier/features/reputation). Use this example formatting:
-     Here are some of the latest GPUs (2025) you might consider for your PC-building project:
-     Then display them as bullet points (•)
-     • ASUS GeForce RTX 5090 — Top-tier enthusiast GPU for 2025; often called the uncontested best graphics card this year.
-     • Gigabyte Radeon RX 9060 XT 16 GB — A newer high-end card offering strong price-to-performance.
-     • ASUS Prime Radeon RX 9060 XT 16 GB — Alternate brand version of the RX 9060 XT offering similar performance.
-  5) Apply this behavior for all component categories including motherboards, CPUs, GPUs, RAM, storage drives (HDD, SSD, NVMe), CPU coolers, and power supplies (PSUs). If your list items come from general market knowledge, be explicit about the year associated with each item (e.g., '2025').
-  6) If your list includes items that are present in the provided database, prefer those database items first, but still include additional relevant market items if needed to reach 3–5 results.
-  7) Keep bullets concise (1 sentence each), neutral in tone, and avoid long paragraphs. Do NOT include links or long spec tables — name + short blurb only.
-
-- When the question involves CPU vs GPU compatibility, determine compatibility based on performance balance (bottleneck analysis) rather than socket. State whether the pairing is well-balanced or which side may bottleneck the other, and include an estimated bottleneck percentage (see ranges below). Keep this explanation within 3–5 sentences.
-  Then display them as bullet points (•)
-  • Well-balanced: bottleneck minimal (0–5%).
-  • CPU-limits-GPU: estimate ~10–30% CPU bottleneck depending on severity.
-  • GPU-limits-CPU: estimate ~10–20% GPU bottleneck.
-- If the user asks where to buy PC components or mentions computer shops, respond with:
-  'Here are PC hardware stores that are reputable and have both physical and online presence. These might be great stops for your PC-building part-selection research.'
-  Then display them as bullet points (•) in this exact order and with short positive descriptions:
-  • SMFP Computer Trading — Trusted store in Quiapo, Manila offering quality PC components and excellent customer service.
-  • PC Express — One of the largest and most established PC retailers in the Philippines, with wide store coverage and online availability.
-  • DynaQuest PC — Known for reliable mid-to-high-end gaming builds, with competitive prices and nationwide delivery.
-  • EasyPC — Popular for budget-friendly PC parts and online promos; great for value-seeking builders.
-  • DataBlitz — Well-known tech retail chain that also carries PC peripherals and gaming accessories.
-  • PCHub — A reputable tech hub in Metro Manila offering a variety of enthusiast and custom build components.
-
-- If the user specifically mentions a location (e.g., 'near Quezon City', 'Cebu', or 'Davao'), actively check online sources to find nearby branches or delivery coverage. Prefer a Google Maps search (or the web) to confirm store branches, opening hours, and delivery availability.
-- For recommendations, builds, or part-selection guidance, strictly use only the components found in the provided database unless the user explicitly asks for market/latest items.
-- If the question clearly has no relation to PC components or computing hardware, respond with that line.
-- Do NOT start responses with greetings or introductions unless the user’s input was a greeting.
-- Keep all responses educational, neutral, and concise.
-
-"Never write paragraphs. Always use one short factual line followed by bullet points. "
-"Never start with 'Yes' or 'No' — keep the tone objective and concise."
-
-
-User question: {query}"""
-
-    try:
-        app.logger.info("Calling Gemini for query: %s", query)
-        resp = CLIENT.models.generate_content(
-            model="gemini-2.5-flash-lite",
-            contents=prompt,
-        )
-    except Exception as e:
-        app.logger.exception("Model call failed")
-        return (
-            "Model call failed: " + str(e),
-            502,
-            {"Content-Type": "text/plain; charset=utf-8"},
-        )
-
-    raw_text = getattr(resp, "text", None) or str(resp)
-    app.logger.info("Raw model output (truncated): %s", raw_text[:300])
-
-    # --- Output cleaning ---
-    def clean_output(s: str) -> str:
-        s = s.strip()
-        if s.startswith("```") and s.endswith("```"):
-            lines = s.splitlines()
-            if len(lines) >= 3:
-                s = "\n".join(lines[1:-1])
-        if (s.startswith('"') and s.endswith('"')) or (
-            s.startswith("'") and s.endswith("'")
-        ):
-            s = s[1:-1]
-        try:
-            import unicodedata
-
-            s = unicodedata.normalize("NFC", s)
-        except Exception:
-            pass
-        s = re.sub(r"^[`\\s]+", "", s)
-        s = re.sub(r"[`\\s]+$", "", s)
-        return s
-
-    cleaned = clean_output(raw_text)
-
-    # --- If user did NOT greet but model still prepended a greeting, strip it ---
-    try:
-        if not looks_like_greeting(query):
-            m = re.match(
-                r"^\s*(?:hi|hello|hey|hiya|greetings|good morning|good afternoon|good evening)\b[^.?!]{0,200}[.?!]\s*",
-                cleaned,
-                flags=re.IGNORECASE,
+    question = " ".join(query.split())
+    latest_text = _latest_items_answer(question)
+    if latest_text is not None:
+        return (latest_text, 200, TXT_HEADERS)
+
+    strip_greeting = not greeted
+    key = _answer_key(question)
+    raw_text = _answer_cache_get(key)
+
+    waited = False
+    if raw_text is None and STREAM_ANSWERS and BATCH_WINDOW <= 0:
+        inflight, leader = _answer_claim(key)
+        if not leader:
+            # The same question is already being answered; reuse that call
+            raw_text = _answer_wait(inflight)
+            waited = True
+        else:
+            try:
+                app.logger.info("Streaming Gemini answer for query: %s", query)
+                chunks = _open_answer_stream(question)
+            except Exception as e:
+                _answer_release(key, inflight)
+                app.logger.exception("Model call failed")
+                return (
+                    "Model call failed: " + str(e),
+                    502,
+                    TXT_HEADERS,
+                )
+            return Response(
+                _stream_answer(chunks, key, strip_greeting, inflight),
+                200,
+                TXT_HEADERS,
             )
-            if m:
-                cleaned = cleaned[m.end() :].lstrip()
-                cleaned = re.sub(r'^[`"\'\s]+', "", cleaned)
-    except Exception:
-        pass
 
-    # Try to parse JSON only if model returned JSON; otherwise use cleaned text
-    try:
-        parsed = json.loads(cleaned)
-        if isinstance(parsed, dict):
-            readable = (
-                parsed.get("note")
-                or parsed.get("reason")
-                or json.dumps(parsed, ensure_ascii=False)
+    if raw_text is None:
+        try:
+            app.logger.info("Calling Gemini for query: %s", query)
+            # Don't wait a second time on a leader that just failed or timed out
+            raw_text = _cached_gemini_answer(question, wait=not waited)
+        except Exception as e:
+            app.logger.exception("Model call failed")
+            return (
+                "Model call failed: " + str(e),
+                502,
+                TXT_HEADERS,
             )
-        else:
-            readable = json.dumps(parsed, ensure_ascii=False)
-    except Exception:
-        readable = cleaned
+        if app.logger.isEnabledFor(logging.INFO):
+            app.logger.info("Raw model output (truncated): %s", raw_text[:300])
 
-    return (readable, 200, {"Content-Type": "text/plain; charset=utf-8"})
+    return (
+        _finish_answer(raw_text, strip_greeting),
+        200,
+        TXT_HEADERS,
+    )
 
 
+# Development server only; in production run `gunicorn flask_app:app`
+# (settings in gunicorn.conf.py).
 if __name__ == "__main__":
     port = int(os.getenv("FLASK_RUN_PORT", 5000))
     app.run(host="0.0.0.0", port=port)
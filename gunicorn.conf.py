@@ -0,0 +1,24 @@
+# gunicorn.conf.py
+# Loaded automatically by `gunicorn flask_app:app` from the project root.
+# Requests mostly wait on Gemini round-trips, so threaded workers let those waits
+# overlap instead of queueing behind one another.
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT') or os.getenv('FLASK_RUN_PORT', '5000')}"
+# GUNICORN_WORKER_CLASS=gevent swaps threads for greenlets (pip install gevent);
+# gunicorn's gevent worker monkey-patches before the app is imported.
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("GUNICORN_THREADS", 32))
+# Concurrent requests per gevent/eventlet worker (ignored by gthread)
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 1000))
+# Streamed model answers can keep a request open for a while
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+# Import the app (DB, name index, price tables, prompts) once in the master; workers
+# inherit it copy-on-write instead of each rebuilding it. Threads (the batch worker,
+# pool threads) are only started after the fork. Off by default for gevent/eventlet,
+# which must monkey-patch before the app is imported; GUNICORN_PRELOAD=0/1 overrides.
+preload_app = os.getenv(
+    "GUNICORN_PRELOAD", "1" if worker_class in ("gthread", "sync") else "0"
+) != "0"
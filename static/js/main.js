@@ -114,6 +114,19 @@
         wrapper.appendChild(hint);
     }
 
+    // Spec tables may arrive before their blurb; fetch it separately
+    function fillSpecDescriptions(container) {
+        container.querySelectorAll('.spec-desc[data-name]').forEach(async (el) => {
+            try {
+                const res = await fetch('/api/describe?name=' + encodeURIComponent(el.dataset.name));
+                if (!res.ok) throw new Error(res.statusText);
+                el.textContent = await res.text();
+            } catch (err) {
+                el.remove();
+            }
+        });
+    }
+
     async function sendQuery(query) {
         if (!query || !query.trim()) return;
         appendMessage('user', query);
@@ -132,18 +145,43 @@
             });
 
             const ct = (res.headers.get('Content-Type') || '').toLowerCase();
-            const text = await res.text();
-
-            thinkingMsg.remove();
 
             if (ct.includes('text/html')) {
+                const text = await res.text();
+                thinkingMsg.remove();
                 const assistantMsg = appendMessage('aria', '', true);
                 try {
                     handleAssistantHtml(assistantMsg, text);
                 } catch (err) {
                     safeInnerHTML(assistantMsg, text);
                 }
+                fillSpecDescriptions(assistantMsg);
+            } else if (res.body && typeof TextDecoder !== 'undefined') {
+                // Plain-text answers may be streamed; show them as they arrive
+                const reader = res.body.getReader();
+                const decoder = new TextDecoder();
+                let text = '';
+                let assistantMsg = null;
+                while (true) {
+                    const { done, value } = await reader.read();
+                    text += done ? decoder.decode() : decoder.decode(value, { stream: true });
+                    if (text && !assistantMsg) {
+                        thinkingMsg.remove();
+                        assistantMsg = appendMessage('aria', '', false);
+                    }
+                    if (assistantMsg) {
+                        assistantMsg.textContent = text;
+                        chatBox.scrollTop = chatBox.scrollHeight;
+                    }
+                    if (done) break;
+                }
+                if (!assistantMsg) {
+                    thinkingMsg.remove();
+                    appendMessage('aria', text, false);
+                }
             } else {
+                const text = await res.text();
+                thinkingMsg.remove();
                 appendMessage('aria', text, false);
             }
         } catch (err) {
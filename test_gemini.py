@@ -4,37 +4,63 @@ from dotenv import load_dotenv
 load_dotenv()
 
 API_KEY = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-if not API_KEY:
-    raise SystemExit("Set GEMINI_API_KEY or GOOGLE_API_KEY in your environment or .env")
+# Set SKIP_GEMINI_NET=1 (or true/yes) to skip the network call (offline runs, CI)
+SKIP_NET = os.getenv("SKIP_GEMINI_NET", "").strip().lower() in ("1", "true", "yes")
 
 try:
     from google import genai
 except Exception as e:
-    raise SystemExit(
-        "google-genai package missing or import failed.\n"
-        "Install it using: pip install google-genai\n"
-        f"Error details: {e}"
-    )
+    genai = None
+    GENAI_IMPORT_ERROR = e
 
-def main():
-    """Simple connectivity test for Gemini 2.5 Flash Lite"""
-  
-    client = genai.Client(api_key=API_KEY)
+# One model call per process, however many times the check runs
+_REPLY = None
 
-  
-    try:
+
+def _connectivity_reply():
+    global _REPLY
+    if _REPLY is None:
+        client = genai.Client(api_key=API_KEY)
         resp = client.models.generate_content(
-            model="gemini-2.5-flash-lite",  
+            model="gemini-2.5-flash-lite",
             contents="Hello from aria-nlp test. Please respond with the word 'connected' only.",
         )
+        _REPLY = getattr(resp, "text", None) or str(resp)
+    return _REPLY
+
+
+def main():
+    """Simple connectivity test for Gemini 2.5 Flash Lite"""
+    if SKIP_NET:
+        print("SKIP_GEMINI_NET is set; skipping the Gemini connectivity check.")
+        return
+    if not API_KEY:
+        raise SystemExit("Set GEMINI_API_KEY or GOOGLE_API_KEY in your environment or .env")
+    if genai is None:
+        raise SystemExit(
+            "google-genai package missing or import failed.\n"
+            "Install it using: pip install google-genai\n"
+            f"Error details: {GENAI_IMPORT_ERROR}"
+        )
+
+    try:
+        text = _connectivity_reply()
     except Exception as e:
         print("Model request failed:", e)
         return
 
-    text = getattr(resp, "text", None) or str(resp)
-
     print("\n✅ Model response:")
     print(text)
 
+
+def test_gemini_connectivity():
+    """pytest entry point; skipped offline instead of failing collection."""
+    import pytest
+
+    if SKIP_NET or not API_KEY or genai is None:
+        pytest.skip("Gemini connectivity check disabled (SKIP_GEMINI_NET, no API key, or no google-genai)")
+    assert _connectivity_reply()
+
+
 if __name__ == "__main__":
     main()
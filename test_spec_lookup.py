@@ -0,0 +1,19 @@
+import os
+
+# flask_app refuses to import without a key; lookups here never call the model
+os.environ.setdefault("GEMINI_API_KEY", "offline-test")
+
+import flask_app
+
+
+def _lookup(query):
+    match = flask_app._resolve_component(flask_app.normalize_text(query), 0.35)
+    return match[0][0] if match else None
+
+
+def test_hyphenated_names_match_when_typed_with_spaces():
+    """Spec lookups ignore hyphens: "b650 plus" finds ASUS PRIME B650-PLUS."""
+    assert _lookup("specs b650 plus") == "ASUS PRIME B650-PLUS"
+    assert _lookup("specs msi b450m a") == "MSI B450M-A PRO MAX II"
+    assert _lookup("configuration for x670 p wifi") == "MSI PRO X670-P WIFI"
+    assert _lookup("specs asus prime b650-plus") == "ASUS PRIME B650-PLUS"